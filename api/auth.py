@@ -2,11 +2,16 @@ from rest_framework.authentication import TokenAuthentication
 from rest_framework import exceptions
 
 from api.models import ApiKey, AuthToken
+from api import authcache
 
 class TokenAndKeyAuthentication(TokenAuthentication):
     """A custom token authetication backend that checks the an API key as well.
     
-    Additionally, the the user account must be active and verified.
+    Additionally, the the user account must be active and verified and
+    the token must have been used within AUTH_TOKEN_EXPIRY. Using a token
+    extends its lifetime.
+
+    API key validity and the token's user are cached (see api.authcache)
     """
     
     model = AuthToken
@@ -16,7 +21,7 @@ class TokenAndKeyAuthentication(TokenAuthentication):
         
         # Currently we accept requests without API keys, but
         # if an API key is specified, it must be correct
-        if apikey and not ApiKey.objects.filter(key=apikey, active=True).exists():
+        if apikey and not self.check_apikey(apikey):
             raise exceptions.AuthenticationFailed('Invalid API key')
         
         auth = super(TokenAndKeyAuthentication, self).authenticate(request)
@@ -30,3 +35,26 @@ class TokenAndKeyAuthentication(TokenAuthentication):
             raise exceptions.AuthenticationFailed('User account is inactive!')
         
         return auth
+
+    def check_apikey(self, apikey):
+        valid = authcache.get_apikey(apikey)
+        if valid is None:
+            valid = ApiKey.objects.filter(key=apikey, active=True).exists()
+            authcache.set_apikey(apikey, valid)
+        return valid
+
+    def authenticate_credentials(self, key):
+        auth = authcache.get_token(key)
+        if auth is None:
+            # Invalid tokens are not cached: the lookup raises an exception
+            auth = super(TokenAndKeyAuthentication, self).authenticate_credentials(key)
+            authcache.set_token(key, auth)
+
+        token = auth[1]
+        if token.is_expired():
+            raise exceptions.AuthenticationFailed('Token has expired')
+
+        if token.renew():
+            authcache.set_token(key, auth)
+
+        return auth
@@ -0,0 +1,55 @@
+"""
+A short lived cache for API key and authentication token validation.
+
+Authenticating an API request needs the API key's validity and the
+token's user. Both are cached in the "auth" cache (see CACHES in
+settings), so that the hot path of an authenticated request does not
+need any database queries.
+
+Cached entries are invalidated when API keys, tokens or users are
+saved or deleted (see the signal handlers in api.models.) The cache
+timeout bounds how long a change made in another process can go
+unnoticed, unless the "auth" cache is shared between processes.
+"""
+
+from __future__ import unicode_literals
+
+from django.core.cache import caches
+
+import hashlib
+
+CACHE_ALIAS = 'auth'
+
+def _cache():
+    return caches[CACHE_ALIAS]
+
+def _cache_key(prefix, key):
+    # API keys and tokens are user input: hash them to get a valid cache key
+    return prefix + hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+def apikey_key(key):
+    return _cache_key('apikey:', key)
+
+def token_key(key):
+    return _cache_key('token:', key)
+
+def get_apikey(key):
+    """Get the cached validity of an API key, or None if not cached."""
+    return _cache().get(apikey_key(key))
+
+def set_apikey(key, valid):
+    _cache().set(apikey_key(key), valid)
+
+def get_token(key):
+    """Get the cached (user, token) pair of a token key, or None if not cached."""
+    return _cache().get(token_key(key))
+
+def set_token(key, auth):
+    _cache().set(token_key(key), auth)
+
+def invalidate_apikey(key):
+    _cache().delete(apikey_key(key))
+
+def invalidate_tokens(*keys):
+    if keys:
+        _cache().delete_many([token_key(k) for k in keys])
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from api.models import AuthToken
+
+class Command(BaseCommand):
+    help = "Delete expired authentication tokens"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', action='store', type=int, default=1000, dest='batch_size',
+                            help='How many tokens to delete in one transaction')
+
+    def handle(self, *args, **options):
+        self.verbosity = int(options.get('verbosity'))
+        batch_size = options['batch_size']
+
+        # Deleting in batches keeps the transactions (and locks) short
+        total = 0
+        while True:
+            keys = list(AuthToken.expired().values_list('key', flat=True)[:batch_size])
+            if not keys:
+                break
+
+            AuthToken.objects.filter(key__in=keys).delete()
+            total += len(keys)
+
+            if self.verbosity > 1:
+                self.stdout.write("Deleted {} expired tokens".format(total))
+
+        if self.verbosity > 0:
+            self.stdout.write("Deleted {} expired tokens in total".format(total))
@@ -0,0 +1,21 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10 on 2026-10-17 12:10
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_authtoken_user'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='authtoken',
+            name='last_used',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now, verbose_name='Last used'),
+        ),
+    ]
@@ -2,6 +2,11 @@ from __future__ import unicode_literals
 
 from django.db import models
 from django.conf import settings
+from django.utils import timezone
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from api import authcache
 
 import os
 import binascii
@@ -15,6 +20,7 @@ class AuthToken(models.Model):
     key = models.CharField("Key", max_length=40, primary_key=True)
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     created = models.DateTimeField("Created", auto_now_add=True)
+    last_used = models.DateTimeField("Last used", default=timezone.now, db_index=True)
 
     @classmethod
     def create_for(cls, user):
@@ -22,7 +28,59 @@ class AuthToken(models.Model):
             key=cls.generate_key(),
             user=user
             )
+
+    @classmethod
+    def expired(cls, now=None):
+        """Get tokens that have not been used within AUTH_TOKEN_EXPIRY"""
+        now = now or timezone.now()
+        return cls.objects.filter(last_used__lt=now - settings.AUTH_TOKEN_EXPIRY)
+
+    def is_expired(self, now=None):
+        now = now or timezone.now()
+        return self.last_used < now - settings.AUTH_TOKEN_EXPIRY
+
+    def renew(self, now=None):
+        """Extend the token's lifetime, if it was last renewed
+        more than AUTH_TOKEN_RENEW_INTERVAL ago.
+
+        Returns True if the token was renewed.
+        """
+        now = now or timezone.now()
+        if self.last_used > now - settings.AUTH_TOKEN_RENEW_INTERVAL:
+            return False
+
+        AuthToken.objects.filter(key=self.key).update(last_used=now)
+        self.last_used = now
+        return True
     
     @staticmethod
     def generate_key():
         return binascii.hexlify(os.urandom(20)).decode()
+
+
+# Keep the authentication cache up to date
+
+@receiver(pre_save, sender=ApiKey)
+def _remember_apikey(sender, instance, **kwargs):
+    # The key can be edited, and the old one may still be cached
+    instance._saved_key = None
+    if instance.pk is not None:
+        instance._saved_key = ApiKey.objects.filter(pk=instance.pk).values_list('key', flat=True).first()
+
+@receiver([post_save, post_delete], sender=ApiKey)
+def _invalidate_apikey(sender, instance, **kwargs):
+    authcache.invalidate_apikey(instance.key)
+
+    saved_key = getattr(instance, '_saved_key', None)
+    if saved_key is not None and saved_key != instance.key:
+        authcache.invalidate_apikey(saved_key)
+
+@receiver(post_delete, sender=AuthToken)
+def _invalidate_token(sender, instance, **kwargs):
+    authcache.invalidate_tokens(instance.key)
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def _invalidate_user_tokens(sender, instance, created, **kwargs):
+    # The cached tokens hold a copy of the user
+    if not created:
+        authcache.invalidate_tokens(*AuthToken.objects.filter(user=instance).values_list('key', flat=True))
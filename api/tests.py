@@ -1,3 +1,104 @@
-from django.test import TestCase
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework import exceptions
+from rest_framework.test import APIRequestFactory
 
-# Create your tests here.
+from palvelutori.models import User
+from api.auth import TokenAndKeyAuthentication
+from api.models import ApiKey, AuthToken
+
+import datetime
+
+@override_settings(CACHES={
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'auth': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'auth-test'},
+})
+class AuthCacheTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('auth@example.com', 'password', is_verified=True)
+        self.token = AuthToken.create_for(self.user)
+        self.apikey = ApiKey.objects.create(key='testkey')
+        self.request = APIRequestFactory().get('/',
+            HTTP_AUTHORIZATION='Token ' + self.token.key,
+            X_API_KEY=self.apikey.key)
+
+    def test_cached(self):
+        auth = TokenAndKeyAuthentication()
+
+        with self.assertNumQueries(2):
+            user, token = auth.authenticate(self.request)
+        self.assertEqual(user.pk, self.user.pk)
+
+        with self.assertNumQueries(0):
+            user, token = auth.authenticate(self.request)
+        self.assertEqual(user.pk, self.user.pk)
+        self.assertEqual(token.key, self.token.key)
+
+    def test_token_invalidation(self):
+        auth = TokenAndKeyAuthentication()
+        auth.authenticate(self.request)
+
+        # Logging out deletes the token
+        self.token.delete()
+        self.assertRaises(exceptions.AuthenticationFailed, auth.authenticate, self.request)
+
+    def test_user_invalidation(self):
+        auth = TokenAndKeyAuthentication()
+        auth.authenticate(self.request)
+
+        self.user.is_active = False
+        self.user.save()
+        self.assertRaises(exceptions.AuthenticationFailed, auth.authenticate, self.request)
+
+    def test_apikey_invalidation(self):
+        auth = TokenAndKeyAuthentication()
+        auth.authenticate(self.request)
+
+        self.apikey.active = False
+        self.apikey.save()
+        self.assertRaises(exceptions.AuthenticationFailed, auth.authenticate, self.request)
+
+    def test_apikey_change_invalidation(self):
+        auth = TokenAndKeyAuthentication()
+        auth.authenticate(self.request)
+
+        # The old key no longer works after the key is changed
+        self.apikey.key = 'newkey'
+        self.apikey.save()
+        self.assertRaises(exceptions.AuthenticationFailed, auth.authenticate, self.request)
+
+
+class TokenExpiryTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('expiry@example.com', 'password', is_verified=True)
+
+    def request(self, token):
+        return APIRequestFactory().get('/', HTTP_AUTHORIZATION='Token ' + token.key)
+
+    def test_expiry(self):
+        token = AuthToken.create_for(self.user)
+        auth = TokenAndKeyAuthentication()
+
+        # Recently used token is not renewed on every request
+        with self.assertNumQueries(1):
+            auth.authenticate(self.request(token))
+
+        # Old but unexpired token is renewed
+        AuthToken.objects.update(last_used=timezone.now() - datetime.timedelta(days=1))
+        auth.authenticate(self.request(token))
+        self.assertTrue(AuthToken.objects.get().last_used > timezone.now() - datetime.timedelta(minutes=1))
+
+        # Expired token is not accepted
+        with self.settings(AUTH_TOKEN_EXPIRY=datetime.timedelta(seconds=0)):
+            self.assertRaises(exceptions.AuthenticationFailed, auth.authenticate, self.request(token))
+
+    def test_prune(self):
+        for i in range(5):
+            AuthToken.create_for(self.user)
+        AuthToken.objects.update(last_used=timezone.now() - datetime.timedelta(days=100))
+        fresh = AuthToken.create_for(self.user)
+
+        call_command('prunetokens', batch_size=2, verbosity=0)
+
+        self.assertEqual(list(AuthToken.objects.values_list('key', flat=True)), [fresh.key])
@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+# coding=utf-8
+
+"""
+Free time slot search across companies.
+"""
+
+from __future__ import unicode_literals
+
+from itertools import groupby
+from psycopg2.extras import DateTimeTZRange
+
+from . import models, utils
+
+def find_free_slots(start, end, duration, postalcode=None, service_package=None):
+    """Find the free time slots of every matching company in the given time window.
+
+    A slot is free when the company has marked itself available and has
+    no busy entries for that time. Only slots at least ``duration`` long
+    are returned.
+
+    :param start: start of the time window (aware datetime)
+    :param end: end of the time window (aware datetime)
+    :param duration: minimum slot length (timedelta)
+    :param postalcode: only companies serving this postal code
+    :param service_package: only companies offering this service package (id)
+    :return: list of {'company': id, 'slots': [{'start': datetime, 'end': datetime}]}
+    """
+    entries = models.CalendarEntry.objects.filter(
+        company__active=True,
+        period__overlap=DateTimeTZRange(start, end),
+        )
+
+    if postalcode:
+        entries = entries.filter(company__service_areas__overlap=[postalcode])
+
+    if service_package:
+        entries = entries.filter(company__offered_services=service_package)
+
+    entries = entries.order_by('company_id', 'start').values_list('company_id', 'start', 'end', 'busy')
+
+    out = []
+    for company_id, rows in groupby(entries.iterator(), key=lambda row: row[0]):
+        available = []
+        busy = []
+        for _, s, e, is_busy in rows:
+            (busy if is_busy else available).append((max(s, start), min(e, end)))
+
+        free = utils.subtract_intervals(
+            utils.merge_intervals(available),
+            utils.merge_intervals(busy)
+            )
+
+        slots = [{'start': s, 'end': e} for s, e in free if e - s >= duration]
+        if slots:
+            out.append({
+                'company': company_id,
+                'slots': slots,
+            })
+
+    return out
@@ -4,9 +4,14 @@
 from __future__ import unicode_literals
 
 import django_filters
+from django_filters.filters import BaseRangeFilter
 from rest_framework import filters
 from . import models
 
+class IsoDateTimeRangeFilter(BaseRangeFilter, django_filters.IsoDateTimeFilter):
+    """Filter taking two comma separated ISO 8601 datetimes"""
+    pass
+
 class CalendarEntryFilter(filters.FilterSet):
     start__gt = django_filters.IsoDateTimeFilter(name='start', lookup_expr='gt')
     start__gte = django_filters.IsoDateTimeFilter(name='start', lookup_expr='gte')
@@ -18,6 +23,9 @@ class CalendarEntryFilter(filters.FilterSet):
     end__lt = django_filters.IsoDateTimeFilter(name='end', lookup_expr='lt')
     end__lte = django_filters.IsoDateTimeFilter(name='end', lookup_expr='lte')
 
+    # Entries overlapping the given period: ?overlaps=start,end
+    overlaps = IsoDateTimeRangeFilter(name='period', lookup_expr='overlap')
+
     class Meta:
         model = models.CalendarEntry
         fields = ['company']
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, IntegrityError
+
+from calendars.models import BUSY_CONSTRAINT_NAME as CONSTRAINT_NAME
+
+class Command(BaseCommand):
+    help = "Add (or drop) a database constraint preventing overlapping busy calendar entries within a company"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--drop', action='store_true', dest='drop',
+                            help='Remove the constraint')
+
+    def handle(self, *args, **options):
+        with connection.cursor() as cursor:
+            if options.get('drop'):
+                cursor.execute('ALTER TABLE calendars_calendarentry DROP CONSTRAINT IF EXISTS ' + CONSTRAINT_NAME)
+                return
+
+            try:
+                cursor.execute(
+                    'ALTER TABLE calendars_calendarentry ADD CONSTRAINT ' + CONSTRAINT_NAME +
+                    ' EXCLUDE USING gist (company_id WITH =, period WITH &&) WHERE (busy)'
+                )
+            except IntegrityError as ex:
+                raise CommandError("Existing busy entries overlap: {}".format(ex))
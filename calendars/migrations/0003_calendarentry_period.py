@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10 on 2026-10-17 11:20
+from __future__ import unicode_literals
+
+import django.contrib.postgres.fields.ranges
+from django.contrib.postgres.operations import CreateExtension
+from django.db import migrations
+
+PERIOD_FUNCTION_SQL = """
+CREATE FUNCTION calendars_calendarentry_period() RETURNS trigger AS $$
+BEGIN
+    IF NEW.start <= NEW."end" THEN
+        NEW.period := tstzrange(NEW.start, NEW."end");
+    ELSE
+        NEW.period := 'empty';
+    END IF;
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql
+"""
+
+PERIOD_TRIGGER_SQL = """
+CREATE TRIGGER calendars_calendarentry_period
+    BEFORE INSERT OR UPDATE ON calendars_calendarentry
+    FOR EACH ROW EXECUTE PROCEDURE calendars_calendarentry_period()
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('calendars', '0002_auto_20160503_1204'),
+    ]
+
+    operations = [
+        # Needed for the company_id column in the GiST index
+        CreateExtension('btree_gist'),
+        migrations.AddField(
+            model_name='calendarentry',
+            name='period',
+            field=django.contrib.postgres.fields.ranges.DateTimeRangeField(editable=False, null=True),
+        ),
+        migrations.RunSQL(
+            [PERIOD_FUNCTION_SQL, PERIOD_TRIGGER_SQL, 'UPDATE calendars_calendarentry SET start = start'],
+            ['DROP TRIGGER calendars_calendarentry_period ON calendars_calendarentry',
+             'DROP FUNCTION calendars_calendarentry_period()'],
+        ),
+        migrations.RunSQL(
+            ['CREATE INDEX calendars_calendarentry_company_period_gist ON calendars_calendarentry USING gist (company_id, period)'],
+            ['DROP INDEX calendars_calendarentry_company_period_gist'],
+        ),
+    ]
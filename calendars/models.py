@@ -4,6 +4,7 @@
 from __future__ import unicode_literals
 
 from django.db import models
+from django.contrib.postgres.fields import DateTimeRangeField
 from django.utils.encoding import python_2_unicode_compatible
 from django.core.exceptions import ValidationError
 from . import utils
@@ -11,6 +12,10 @@ from . import utils
 STR_BUSY = 'busy'
 STR_AVAILABLE = 'available'
 
+# Exclusion constraint preventing overlapping busy entries within a
+# company (see the busyconstraint command)
+BUSY_CONSTRAINT_NAME = 'calendars_calendarentry_busy_no_overlap'
+
 class CalendarEntry(models.Model):
     class Meta:
         ordering = ('end','start')
@@ -24,6 +29,10 @@ class CalendarEntry(models.Model):
 
     busy = models.BooleanField(default=False, help_text='Busy or available, defaults to available (False)')
 
+    # [start, end) range maintained by a database trigger.
+    # Indexed (with company) for fast overlap queries.
+    period = DateTimeRangeField(null=True, editable=False)
+
     company = models.ForeignKey('organisation.Company', null=True, blank=True, on_delete=models.CASCADE)
 
     def __str__(self):
@@ -6,9 +6,15 @@ from __future__ import unicode_literals
 from rest_framework import serializers
 from . import models
 
+from decimal import Decimal
+import datetime
+
+MAX_AVAILABILITY_WINDOW = datetime.timedelta(days=31)
+
 class CalendarEntrySerializer(serializers.ModelSerializer):
     class Meta:
         model = models.CalendarEntry
+        exclude = ('period',)
 
     def validate(self, data):
         """
@@ -17,3 +23,24 @@ class CalendarEntrySerializer(serializers.ModelSerializer):
         if data['start'] > data['end']:
             raise serializers.ValidationError("End must occur after start")
         return data
+
+
+class AvailabilityQuerySerializer(serializers.Serializer):
+    start = serializers.DateTimeField(help_text='Start of the time window')
+    end = serializers.DateTimeField(help_text='End of the time window')
+    duration = serializers.DecimalField(
+        max_digits=4,
+        decimal_places=1,
+        min_value=Decimal('0.1'),
+        coerce_to_string=False,
+        help_text='Minimum length of a free slot in hours (decimal with one decimal place)'
+    )
+    postalcode = serializers.CharField(max_length=5, required=False, help_text='Postal code the company must serve')
+    service_package = serializers.IntegerField(required=False, help_text='Service package id the company must offer')
+
+    def validate(self, data):
+        if data['start'] >= data['end']:
+            raise serializers.ValidationError("End must occur after start")
+        if data['end'] - data['start'] > MAX_AVAILABILITY_WINDOW:
+            raise serializers.ValidationError("Time window can be at most {} days".format(MAX_AVAILABILITY_WINDOW.days))
+        return data
@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+# coding=utf-8
+
+from __future__ import unicode_literals
+
+import datetime
+from django.core.urlresolvers import reverse
+from django.test import SimpleTestCase
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
+from organisation.models import Company
+from services.models import ServicePackage
+from . import models, utils
+
+def _dt(hour):
+    return datetime.datetime(2016, 10, 10, hour, tzinfo=timezone.utc)
+
+class IntervalTestCase(SimpleTestCase):
+    def test_merge(self):
+        self.assertEqual(utils.merge_intervals([]), [])
+        self.assertEqual(
+            utils.merge_intervals([(1, 3), (2, 4), (4, 5), (7, 8), (7, 7)]),
+            [(1, 5), (7, 8)]
+        )
+        self.assertEqual(utils.merge_intervals([(1, 10), (2, 3)]), [(1, 10)])
+
+    def test_subtract(self):
+        self.assertEqual(utils.subtract_intervals([(0, 10)], []), [(0, 10)])
+        self.assertEqual(
+            utils.subtract_intervals([(0, 10)], [(2, 3), (5, 6)]),
+            [(0, 2), (3, 5), (6, 10)]
+        )
+        # A hole spanning several intervals
+        self.assertEqual(
+            utils.subtract_intervals([(0, 4), (5, 8), (9, 12)], [(3, 10)]),
+            [(0, 3), (10, 12)]
+        )
+        self.assertEqual(utils.subtract_intervals([(2, 4)], [(0, 10)]), [])
+
+
+class AvailabilityApiTestCase(APITestCase):
+    url = 'api:calendarentries-availability'
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+
+        cls.package = ServicePackage.objects.create(shortname='siivous', pricing_formula='???')
+
+        cls.company1 = Company.objects.create(name='Company 1', businessid='1111111-1', service_areas=['20100'])
+        cls.company1.offered_services.add(cls.package)
+        cls.company2 = Company.objects.create(name='Company 2', businessid='2222222-2', service_areas=['20200'])
+
+        models.CalendarEntry.objects.bulk_create([
+            # Company 1: available 8-16, busy 10-11 and 12-15
+            models.CalendarEntry(company=cls.company1, start=_dt(8), end=_dt(12)),
+            models.CalendarEntry(company=cls.company1, start=_dt(12), end=_dt(16)),
+            models.CalendarEntry(company=cls.company1, start=_dt(10), end=_dt(11), busy=True),
+            models.CalendarEntry(company=cls.company1, start=_dt(12), end=_dt(15), busy=True),
+            # Company 2: available 8-10
+            models.CalendarEntry(company=cls.company2, start=_dt(8), end=_dt(10)),
+        ])
+
+    def query(self, **params):
+        response = self.client.get(reverse(self.url), data=params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return {r['company']: [(s['start'], s['end']) for s in r['slots']] for r in response.data}
+
+    def test_free_slots(self):
+        result = self.query(start=_dt(0).isoformat(), end=_dt(23).isoformat(), duration='1')
+        self.assertEqual(result, {
+            self.company1.id: [(_dt(8), _dt(10)), (_dt(11), _dt(12)), (_dt(15), _dt(16))],
+            self.company2.id: [(_dt(8), _dt(10))],
+        })
+
+        # Too short slots are skipped
+        result = self.query(start=_dt(0).isoformat(), end=_dt(23).isoformat(), duration='1.5')
+        self.assertEqual(result, {
+            self.company1.id: [(_dt(8), _dt(10))],
+            self.company2.id: [(_dt(8), _dt(10))],
+        })
+
+        # Slots are clipped to the time window
+        result = self.query(start=_dt(9).isoformat(), end=_dt(23).isoformat(), duration='1')
+        self.assertEqual(result, {
+            self.company1.id: [(_dt(9), _dt(10)), (_dt(11), _dt(12)), (_dt(15), _dt(16))],
+            self.company2.id: [(_dt(9), _dt(10))],
+        })
+
+    def test_company_filters(self):
+        result = self.query(start=_dt(0).isoformat(), end=_dt(23).isoformat(), duration='1', postalcode='20200')
+        self.assertEqual(list(result.keys()), [self.company2.id])
+
+        result = self.query(start=_dt(0).isoformat(), end=_dt(23).isoformat(), duration='1', service_package=self.package.id)
+        self.assertEqual(list(result.keys()), [self.company1.id])
+
+    def test_invalid_window(self):
+        response = self.client.get(reverse(self.url), data={
+            'start': _dt(10).isoformat(),
+            'end': _dt(9).isoformat(),
+            'duration': '1',
+        })
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
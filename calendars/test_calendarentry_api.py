@@ -5,6 +5,7 @@ from __future__ import unicode_literals
 
 import datetime
 from django.utils import timezone
+from django.core.management import call_command
 from django.core.urlresolvers import reverse
 from rest_framework import status
 from rest_framework.test import APITestCase
@@ -347,3 +348,51 @@ class CalendarEntryApiTestCase(BasicCRUDApiTestCaseMixin, APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(len(response.data['results']), manual_query.count())
         self.assertEqual(len(response.data['results']), 1)
+
+    def test_query_overlaps(self):
+        """
+        Entries overlapping a period can be queried with ?overlaps=start,end
+        """
+        start = timezone.now() + datetime.timedelta(hours=1, minutes=30)
+        end = timezone.now() + datetime.timedelta(hours=4, minutes=30)
+
+        url = reverse(self.list_url)
+        response = self.client.get(url, data={'overlaps': start.isoformat() + ',' + end.isoformat()})
+
+        manual_query = self.object_class.objects.filter(start__lt=end, end__gt=start)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            sorted(r['id'] for r in response.data['results']),
+            sorted(o.id for o in manual_query)
+        )
+
+        response = self.client.get(url, data={'overlaps': start.isoformat()})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), 0)
+
+    def test_busy_constraint(self):
+        """
+        With the constraint enabled, busy entries of a company can't overlap
+        """
+        call_command('busyconstraint')
+
+        user = self.template_users['staff_user']
+        self.client.login(email=user['email'], password=user['password'])
+
+        payload = self.create_object.copy()
+        payload['busy'] = True
+
+        url = reverse(self.create_url)
+        response = self.client.post(url, data=payload)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        response = self.client.post(url, data=payload)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        # Available entries may overlap
+        payload['busy'] = False
+        response = self.client.post(url, data=payload)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        call_command('busyconstraint', drop=True)
@@ -9,3 +9,46 @@ DATETIME_FORMAT_SHORT = '%Y-%m-%d %H:%M'
 
 def datetime_formatted_localized(dt, format=DATETIME_FORMAT_SHORT):
     return timezone.localtime(dt).strftime(format)
+
+def merge_intervals(intervals):
+    """Merge overlapping and adjacent intervals.
+
+    :param intervals: iterable of (start, end) tuples sorted by start
+    :return: list of non-overlapping (start, end) tuples
+    """
+    merged = []
+    for start, end in intervals:
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+def subtract_intervals(intervals, holes):
+    """Remove the holes from the intervals.
+
+    Both arguments must be lists of non-overlapping (start, end) tuples
+    sorted by start (see merge_intervals.)
+
+    :return: list of (start, end) tuples
+    """
+    out = []
+    i = 0
+    for start, end in intervals:
+        # Holes that end before this interval can't affect later intervals either
+        while i < len(holes) and holes[i][1] <= start:
+            i += 1
+
+        cur = start
+        j = i
+        while j < len(holes) and holes[j][0] < end:
+            if holes[j][0] > cur:
+                out.append((cur, holes[j][0]))
+            cur = max(cur, holes[j][1])
+            j += 1
+
+        if cur < end:
+            out.append((cur, end))
+
+    return out
@@ -3,19 +3,45 @@
 
 from __future__ import unicode_literals
 
+from django.db import IntegrityError, transaction
 from rest_framework import viewsets
+from rest_framework.exceptions import ValidationError
+from rest_framework.decorators import list_route
 from rest_framework.permissions import IsAuthenticatedOrReadOnly, SAFE_METHODS
-from . import models, serializers, filtersets
+from rest_framework.response import Response
+from palvelutori.pagination import OptionalCursorPagination
+from . import models, serializers, filtersets, availability
+
+import datetime
+
+# exclusion_violation
+EXCLUSION_VIOLATION = '23P01'
+
+def is_busy_overlap(ex):
+    """Whether an IntegrityError was caused by the busy entry overlap constraint."""
+    cause = ex.__cause__
+    return getattr(cause, 'pgcode', None) == EXCLUSION_VIOLATION and \
+        cause.diag.constraint_name == models.BUSY_CONSTRAINT_NAME
 
 class CalendarEntryViewSet(viewsets.ModelViewSet):
     """
     Calendar entries for companies.
     Uses ISO 8601 formatted strings for datetime fields.
+
+    Use ?pagination=cursor for cursor based paging, which is faster for
+    deep pages. Follow the "next" and "previous" links to get more pages.
     """
     queryset = models.CalendarEntry.objects.filter(company__active=True)
     serializer_class = serializers.CalendarEntrySerializer
     filter_class = filtersets.CalendarEntryFilter
     permission_classes = [IsAuthenticatedOrReadOnly]
+    pagination_class = OptionalCursorPagination
+
+    def get_serializer_class(self):
+        if self.action == 'availability':
+            return serializers.AvailabilityQuerySerializer
+
+        return self.serializer_class
 
     def check_company(self, request, company_id):
         if request.user.company_id != int(company_id):
@@ -36,4 +62,58 @@ class CalendarEntryViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         self.check_company(self.request, self.request.data.get('company'))
 
-        return super(CalendarEntryViewSet, self).perform_create(serializer)
+        return self.save_entry(serializer)
+
+    def perform_update(self, serializer):
+        return self.save_entry(serializer)
+
+    def save_entry(self, serializer):
+        # Overlapping busy entries are rejected by the database
+        # if the constraint is enabled (see the busyconstraint command)
+        try:
+            with transaction.atomic():
+                return serializer.save()
+        except IntegrityError as ex:
+            if not is_busy_overlap(ex):
+                raise
+            raise ValidationError("Overlaps with another busy entry")
+
+    @list_route(methods=['get'])
+    def availability(self, request):
+        """Free time slots of all companies in a time window.
+
+        Returns, for each matching company, the periods in which it is available
+        and not busy, that are at least 'duration' hours long.
+        ---
+        parameters_strategy: replace
+        parameters:
+            - name: start
+              required: true
+              type: string
+              paramType: query
+            - name: end
+              required: true
+              type: string
+              paramType: query
+            - name: duration
+              required: true
+              type: number
+              paramType: query
+            - name: postalcode
+              type: string
+              paramType: query
+            - name: service_package
+              type: integer
+              paramType: query
+        """
+        serializer = self.get_serializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        d = serializer.validated_data
+
+        return Response(availability.find_free_slots(
+            start=d['start'],
+            end=d['end'],
+            duration=datetime.timedelta(hours=float(d['duration'])),
+            postalcode=d.get('postalcode'),
+            service_package=d.get('service_package'),
+            ))
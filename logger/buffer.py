@@ -0,0 +1,79 @@
+"""
+In-process buffering of log entries.
+
+When LOGGER_BUFFER is enabled, entries posted to the bulk endpoint are
+collected here and written with a single bulk insert when the buffer
+grows to LOGGER_BUFFER_SIZE entries or LOGGER_BUFFER_INTERVAL seconds
+have passed since the first buffered entry.
+
+Buffered entries are lost if the process is killed before the buffer
+is flushed. Their "created" time is the time they were written.
+"""
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from logger.models import LogEntry
+
+import atexit
+import threading
+
+import logging
+logger = logging.getLogger(__name__)
+
+class LogBuffer(object):
+    def __init__(self, size, interval):
+        self.size = size
+        self.interval = interval
+        self._entries = []
+        self._lock = threading.Lock()
+        self._timer = None
+
+    def add(self, entries):
+        """Add LogEntry instances to the buffer."""
+        with self._lock:
+            self._entries.extend(entries)
+            full = len(self._entries) >= self.size
+
+            if not full and self._timer is None:
+                self._timer = threading.Timer(self.interval, self._flush_from_timer)
+                self._timer.daemon = True
+                self._timer.start()
+
+        if full:
+            self.flush()
+
+    def flush(self):
+        """Write all buffered entries. Returns the number of entries written."""
+        with self._lock:
+            entries, self._entries = self._entries, []
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+
+        if entries:
+            LogEntry.objects.bulk_create(entries, batch_size=self.size)
+
+        return len(entries)
+
+    def _flush_from_timer(self):
+        # Runs in its own thread, which has its own database connection
+        try:
+            self.flush()
+        except Exception:
+            logger.exception("Could not write buffered log entries")
+        finally:
+            close_old_connections()
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+def get_buffer():
+    """Get the process wide log entry buffer."""
+    global _buffer
+    with _buffer_lock:
+        if _buffer is None:
+            _buffer = LogBuffer(settings.LOGGER_BUFFER_SIZE, settings.LOGGER_BUFFER_INTERVAL)
+            atexit.register(_buffer.flush)
+        return _buffer
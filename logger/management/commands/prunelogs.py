@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from logger.models import LogEntry
+from logger import partitions
+
+import datetime
+
+class Command(BaseCommand):
+    help = "Delete old log entries and create log partitions for the coming months"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', action='store', type=int, default=None, dest='days',
+                            help='Delete entries older than this many days')
+        parser.add_argument('--before', action='store', default=None, dest='before',
+                            help='Delete entries created before this (ISO 8601) time')
+        parser.add_argument('--max-severity', action='store', type=int, default=LogEntry.ERROR, dest='max_severity',
+                            help='Only delete entries up to this severity (default is all)')
+        parser.add_argument('--chunk-size', action='store', type=int, default=10000, dest='chunk_size',
+                            help='How many rows to delete in one transaction')
+        parser.add_argument('--months-ahead', action='store', type=int, default=2, dest='months_ahead',
+                            help='Create partitions for this many months ahead')
+
+    def handle(self, *args, **options):
+        self.verbosity = int(options.get('verbosity'))
+
+        now = timezone.now()
+        created = partitions.create_partitions(now, now + datetime.timedelta(days=31 * options['months_ahead']))
+        if self.verbosity > 1:
+            self.stdout.write("Created {} new partitions".format(created))
+
+        before = None
+        if options['before']:
+            before = parse_datetime(options['before'])
+            if before is None:
+                raise CommandError("Invalid time: " + options['before'])
+            if timezone.is_naive(before):
+                before = timezone.make_aware(before)
+        elif options['days'] is not None:
+            before = now - datetime.timedelta(days=options['days'])
+
+        if before is not None:
+            deleted = partitions.delete_entries(before, options['max_severity'], options['chunk_size'],
+                                               drop_partitions=True)
+            if self.verbosity > 0:
+                self.stdout.write("Deleted {} log entries created before {}".format(deleted, before))
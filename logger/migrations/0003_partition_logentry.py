@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10 on 2026-10-17 12:40
+from __future__ import unicode_literals
+
+from django.conf import settings
+from django.db import migrations, transaction
+from django.utils import timezone
+
+import datetime
+
+# Partition the log entry table by month (requires PostgreSQL 11 or newer.)
+# The primary key of a partitioned table must include the partition key,
+# so the primary key constraint is (id, created). The id column is still
+# unique, since it is generated from the same sequence as before.
+#
+# The existing entries are copied in batches, each in its own transaction,
+# so this migration is not atomic. New entries go to the partitioned table
+# while the old ones are being copied.
+
+COPY_BATCH_SIZE = 50000
+
+OWN_SEQUENCE_SQL = """
+DO $$ BEGIN
+    EXECUTE format('ALTER SEQUENCE %s OWNED BY {target}.id', pg_get_serial_sequence('{source}', 'id'));
+END $$
+"""
+
+PARTITION_SQL = [
+    "ALTER TABLE logger_logentry RENAME TO logger_logentry_old",
+    "CREATE TABLE logger_logentry (LIKE logger_logentry_old INCLUDING DEFAULTS) PARTITION BY RANGE (created)",
+    OWN_SEQUENCE_SQL.format(source='logger_logentry_old', target='logger_logentry'),
+    "ALTER TABLE logger_logentry ADD CONSTRAINT logger_logentry_part_pkey PRIMARY KEY (id, created)",
+    "ALTER TABLE logger_logentry ADD CONSTRAINT logger_logentry_part_user_id_fk FOREIGN KEY (user_id) "
+        "REFERENCES palvelutori_user (id) DEFERRABLE INITIALLY DEFERRED",
+    "CREATE INDEX logger_logentry_part_user_id ON logger_logentry (user_id)",
+    "CREATE INDEX logger_logentry_part_created ON logger_logentry (created)",
+    "CREATE TABLE logger_logentry_default PARTITION OF logger_logentry DEFAULT",
+]
+
+UNPARTITION_SQL = [
+    OWN_SEQUENCE_SQL.format(source='logger_logentry', target='logger_logentry_old'),
+    "ALTER TABLE logger_logentry_old ADD PRIMARY KEY (id)",
+    "ALTER TABLE logger_logentry_old ADD CONSTRAINT logger_logentry_user_id_fk FOREIGN KEY (user_id) "
+        "REFERENCES palvelutori_user (id) DEFERRABLE INITIALLY DEFERRED",
+    "CREATE INDEX logger_logentry_user_id ON logger_logentry_old (user_id)",
+    "DROP TABLE logger_logentry",
+    "ALTER TABLE logger_logentry_old RENAME TO logger_logentry",
+]
+
+
+def partition_table(apps, schema_editor):
+    from logger import partitions
+
+    for sql in PARTITION_SQL:
+        schema_editor.execute(sql)
+
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT min(created) FROM logger_logentry_old")
+        oldest = cursor.fetchone()[0]
+
+    now = timezone.now()
+    partitions.create_partitions(oldest or now, now + datetime.timedelta(days=62),
+                                 using=schema_editor.connection.alias)
+
+
+def unpartition_table(apps, schema_editor):
+    for sql in UNPARTITION_SQL:
+        schema_editor.execute(sql)
+
+
+def copy_entries(schema_editor, source, target):
+    """Copy the rows of source to target in batches of ids."""
+    connection = schema_editor.connection
+
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT min(id), max(id) FROM {}".format(source))
+        first, last = cursor.fetchone()
+
+    if first is None:
+        return
+
+    for start in range(first, last + 1, COPY_BATCH_SIZE):
+        with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+            cursor.execute(
+                "INSERT INTO {} SELECT * FROM {} WHERE id >= %s AND id < %s".format(target, source),
+                [start, start + COPY_BATCH_SIZE])
+
+
+def copy_to_partitioned(apps, schema_editor):
+    copy_entries(schema_editor, 'logger_logentry_old', 'logger_logentry')
+
+
+def copy_from_partitioned(apps, schema_editor):
+    copy_entries(schema_editor, 'logger_logentry', 'logger_logentry_old')
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('logger', '0002_auto_20160531_1115'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_table, unpartition_table, atomic=True),
+        migrations.RunPython(copy_to_partitioned, copy_from_partitioned, atomic=False),
+        migrations.RunSQL(
+            "DROP TABLE logger_logentry_old",
+            "CREATE TABLE logger_logentry_old (LIKE logger_logentry INCLUDING DEFAULTS)",
+        ),
+    ]
@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10 on 2026-10-17 13:05
+from __future__ import unicode_literals
+
+from django.contrib.postgres.operations import CreateExtension
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('logger', '0003_partition_logentry'),
+    ]
+
+    operations = [
+        CreateExtension('pg_trgm'),
+        migrations.RunSQL([
+            # These match the expression Django uses for icontains lookups
+            "CREATE INDEX logger_logentry_message_trgm ON logger_logentry USING gin (UPPER(message::text) gin_trgm_ops)",
+            "CREATE INDEX logger_logentry_exception_trgm ON logger_logentry USING gin (UPPER(exception::text) gin_trgm_ops)",
+            "CREATE INDEX logger_logentry_user_created ON logger_logentry (user_id, created)",
+            "CREATE INDEX logger_logentry_severity_created ON logger_logentry (severity, created)",
+            "CREATE INDEX logger_logentry_category ON logger_logentry (category)",
+            # Covered by the (user_id, created) index
+            "DROP INDEX logger_logentry_part_user_id",
+        ], [
+            "CREATE INDEX logger_logentry_part_user_id ON logger_logentry (user_id)",
+            "DROP INDEX logger_logentry_category",
+            "DROP INDEX logger_logentry_severity_created",
+            "DROP INDEX logger_logentry_user_created",
+            "DROP INDEX logger_logentry_exception_trgm",
+            "DROP INDEX logger_logentry_message_trgm",
+        ]),
+    ]
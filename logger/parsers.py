@@ -0,0 +1,26 @@
+from django.conf import settings
+from django.utils import six
+from rest_framework.parsers import BaseParser
+from rest_framework.exceptions import ParseError
+
+import json
+
+class NDJSONParser(BaseParser):
+    """Parses newline delimited JSON into a list of objects."""
+    media_type = 'application/x-ndjson'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+
+        items = []
+        for lineno, line in enumerate(stream, 1):
+            line = line.decode(encoding).strip()
+            if not line:
+                continue
+            try:
+                items.append(json.loads(line))
+            except ValueError as exc:
+                raise ParseError('NDJSON parse error on line %d - %s' % (lineno, six.text_type(exc)))
+
+        return items
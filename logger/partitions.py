@@ -0,0 +1,148 @@
+"""
+Time based partitioning of the log entry table.
+
+The logger_logentry table is partitioned by month on the "created"
+column (see migration 0003.) Each month has its own partition, named
+logger_logentry_pYYYYMM. Entries that do not fall into any monthly
+partition go to the logger_logentry_default partition.
+
+The prunelogs command removes old entries by dropping whole partitions,
+which is instantaneous but locks the whole table, so it is only done
+there. Other entries are deleted row by row, in bounded chunks.
+"""
+
+from django.db import DEFAULT_DB_ALIAS, connection, connections, transaction
+from django.utils import timezone
+
+from logger.models import LogEntry
+
+import datetime
+import re
+
+TABLE = 'logger_logentry'
+DEFAULT_PARTITION = TABLE + '_default'
+
+_PARTITION_RE = re.compile(r'^' + TABLE + r'_p(\d{4})(\d{2})$')
+
+
+def month_start(dt):
+    """Get the start of the month (in UTC) of the given datetime."""
+    dt = dt.astimezone(timezone.utc)
+    return dt.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def next_month(dt):
+    if dt.month == 12:
+        return dt.replace(year=dt.year + 1, month=1)
+    return dt.replace(month=dt.month + 1)
+
+
+def partition_name(month):
+    return '{}_p{:04d}{:02d}'.format(TABLE, month.year, month.month)
+
+
+def partitions(using=DEFAULT_DB_ALIAS):
+    """List the monthly partitions.
+
+    Returns a sorted list of (name, start, end) tuples.
+    """
+    with connections[using].cursor() as cursor:
+        cursor.execute("""
+            SELECT c.relname
+            FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = %s::regclass
+            """, [TABLE])
+        names = [row[0] for row in cursor.fetchall()]
+
+    result = []
+    for name in names:
+        m = _PARTITION_RE.match(name)
+        if m:
+            start = datetime.datetime(int(m.group(1)), int(m.group(2)), 1, tzinfo=timezone.utc)
+            result.append((name, start, next_month(start)))
+
+    result.sort(key=lambda p: p[1])
+    return result
+
+
+def create_partition(month, using=DEFAULT_DB_ALIAS):
+    """Create the partition for the month of the given datetime.
+
+    Entries of that month already in the default partition are moved
+    to the new partition. Does nothing if the partition already exists.
+    Returns True if a new partition was created.
+    """
+    start = month_start(month)
+    end = next_month(start)
+    name = partition_name(start)
+
+    with transaction.atomic(using=using), connections[using].cursor() as cursor:
+        cursor.execute("SELECT to_regclass(%s)", [name])
+        if cursor.fetchone()[0] is not None:
+            return False
+
+        # A partition cannot be created for a range that has rows in the default
+        # partition, so the new partition is filled first and then attached.
+        cursor.execute("CREATE TABLE {} (LIKE {} INCLUDING DEFAULTS)".format(name, TABLE))
+        cursor.execute(
+            "WITH moved AS (DELETE FROM {default} WHERE created >= %s AND created < %s RETURNING *) "
+            "INSERT INTO {name} SELECT * FROM moved".format(default=DEFAULT_PARTITION, name=name),
+            [start, end])
+        cursor.execute(
+            "ALTER TABLE {} ATTACH PARTITION {} FOR VALUES FROM (%s) TO (%s)".format(TABLE, name),
+            [start, end])
+
+    return True
+
+
+def create_partitions(start, end, using=DEFAULT_DB_ALIAS):
+    """Create the monthly partitions from start to end (inclusive.)
+    Returns the number of partitions created.
+    """
+    count = 0
+    month = month_start(start)
+    while month <= end:
+        if create_partition(month, using=using):
+            count += 1
+        month = next_month(month)
+    return count
+
+
+def delete_entries(before, max_severity=LogEntry.ERROR, chunk_size=10000, drop_partitions=False):
+    """Delete log entries created before the given time.
+
+    Entries are deleted in chunks, each in its own transaction. No rows
+    are loaded into Python.
+
+    If drop_partitions is set and all severities are deleted, partitions
+    that end before the given time are dropped first. Detaching a
+    partition locks the whole log table until the transaction ends, so
+    this should not be done while handling requests.
+
+    Returns the number of deleted entries.
+    """
+    total = 0
+
+    if drop_partitions and max_severity >= LogEntry.ERROR:
+        for name, start, end in partitions():
+            if end > before:
+                break
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.execute("ALTER TABLE {} DETACH PARTITION {}".format(TABLE, name))
+                cursor.execute("SELECT count(*) FROM {}".format(name))
+                total += cursor.fetchone()[0]
+                cursor.execute("DROP TABLE {}".format(name))
+
+    while True:
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(
+                "DELETE FROM {table} WHERE id IN ("
+                "SELECT id FROM {table} WHERE created <= %s AND severity <= %s LIMIT %s)".format(table=TABLE),
+                [before, max_severity, chunk_size])
+            deleted = cursor.rowcount
+        total += deleted
+        if deleted < chunk_size:
+            break
+
+    return total
+
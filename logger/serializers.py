@@ -1,3 +1,4 @@
+from django.db.models import Q
 from rest_framework import serializers, filters
 
 from logger.models import LogEntry
@@ -20,7 +21,17 @@ class LogEntrySerializer(serializers.ModelSerializer):
         return le
 
 
+def search_entries(queryset, value):
+    """Find entries whose message or exception contains the text.
+    The message and exception have trigram indexes, which are used
+    when the search text is at least three characters long."""
+    if not value:
+        return queryset
+    return queryset.filter(Q(message__icontains=value) | Q(exception__icontains=value))
+
+
 class LogEntryFilterSet(filters.FilterSet):
+    search = django_filters.CharFilter(action=search_entries)
     message = django_filters.CharFilter(lookup_type='icontains')
     exception = django_filters.CharFilter(lookup_type='icontains')
 
@@ -31,7 +42,7 @@ class LogEntryFilterSet(filters.FilterSet):
 
     class Meta:
         model = LogEntry
-        fields = ('message', 'min_severity', 'category', 'exception', 'ip', 'user')
+        fields = ('search', 'message', 'min_severity', 'category', 'exception', 'ip', 'user')
 
 
 class BulkEraseSerializer(serializers.Serializer):
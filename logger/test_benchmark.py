@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+# coding=utf-8
+
+from __future__ import print_function, unicode_literals
+
+from unittest import skipUnless
+from django.conf import settings
+from django.db import connection
+from django.test import TestCase
+
+from .models import LogEntry
+
+import os
+import random
+import time
+
+ENTRY_COUNT = int(os.environ.get('PALVELUTORI_BENCHMARK_LOG_ENTRIES', 10000000))
+ROUNDS = 20
+
+WORDS = ('connection', 'timeout', 'payment', 'calendar', 'order', 'failed', 'request',
+         'image', 'upload', 'session', 'expired', 'company', 'service', 'invalid')
+
+@skipUnless(settings.TEST_BENCHMARKS, "Benchmarks disabled")
+class LogSearchBenchmark(TestCase):
+    """Search log entries among millions of rows."""
+
+    @classmethod
+    def setUpTestData(cls):
+        # Generated in the database: creating millions of objects in Python is too slow
+        with connection.cursor() as cursor:
+            cursor.execute("""
+                INSERT INTO logger_logentry (message, severity, category, exception, created, ip)
+                SELECT
+                    (%(words)s)[1 + i %% %(wordcount)s] || ' ' || (%(words)s)[1 + (i / 7) %% %(wordcount)s] || ' #' || i,
+                    i %% 5,
+                    'category' || (i %% 20),
+                    CASE WHEN i %% 5 = 4 THEN 'Error ' || md5(i::text) ELSE '' END,
+                    now() - (i %% 5000000) * interval '1 second',
+                    '127.0.0.1'
+                FROM generate_series(1, %(count)s) AS i
+                """, {'words': list(WORDS), 'wordcount': len(WORDS), 'count': ENTRY_COUNT})
+            cursor.execute('ANALYZE logger_logentry')
+
+    def explain(self, q):
+        sql, params = q.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN ' + sql, params)
+            return '\n'.join(row[0] for row in cursor.fetchall())
+
+    def measure(self, name, make_query):
+        rnd = random.Random(0)
+        timings = []
+        for _ in range(ROUNDS):
+            q = make_query(rnd)
+            start = time.perf_counter()
+            list(q[:50])
+            timings.append(time.perf_counter() - start)
+
+        timings.sort()
+        print("\n{} among {} log entries: median {:.3f} ms, 95th percentile {:.3f} ms".format(
+            name,
+            ENTRY_COUNT,
+            timings[len(timings) // 2] * 1000,
+            timings[int(len(timings) * 0.95)] * 1000,
+            ))
+
+    def test_message_search(self):
+        def query(rnd):
+            return LogEntry.objects.filter(message__icontains='#%d' % rnd.randrange(ENTRY_COUNT))
+
+        self.assertIn('Bitmap Index Scan', self.explain(query(random.Random(0))))
+        self.measure("Message search", query)
+
+    def test_severity_filter(self):
+        def query(rnd):
+            return LogEntry.objects.filter(severity__gte=LogEntry.ERROR)
+
+        self.measure("Severity filter", query)
+
+    def test_category_filter(self):
+        def query(rnd):
+            return LogEntry.objects.filter(category='category%d' % rnd.randrange(20))
+
+        self.measure("Category filter", query)
@@ -1,10 +1,17 @@
 from django.core.urlresolvers import reverse
+from django.core.management import call_command
+from django.test import override_settings
 from django.utils import timezone
 from rest_framework.test import APITestCase
 from rest_framework import status
 
 from palvelutori.test_mixins import BasicCRUDApiTestCaseSetupMixin
 from logger.models import LogEntry
+from logger.buffer import get_buffer
+from logger import partitions
+
+import datetime
+import json
 
 class LoggerTestCase(BasicCRUDApiTestCaseSetupMixin, APITestCase):
     object_class = LogEntry
@@ -96,3 +103,89 @@ class LoggerTestCase(BasicCRUDApiTestCaseSetupMixin, APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.data['deleted'], self.object_count)
         self.assertEqual(LogEntry.objects.count(), 0)
+
+    def test_search(self):
+        """The search filter matches messages and exceptions."""
+        LogEntry.objects.create(message='Payment Failed', severity=LogEntry.ERROR, ip='127.0.0.1')
+        LogEntry.objects.create(message='Oops', exception='ValueError: payment failed', severity=LogEntry.ERROR, ip='127.0.0.1')
+        LogEntry.objects.create(message='Payment succeeded', severity=LogEntry.INFO, ip='127.0.0.1')
+
+        user = self.template_users['staff_user']
+        self.client.login(email=user['email'], password=user['password'])
+
+        response = self.client.get(reverse('api:log-list'), {'search': 'payment fail'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['count'], 2)
+
+    def test_cursor_pagination(self):
+        """Cursor pages cover every entry once, even with equal timestamps."""
+        now = timezone.now()
+        LogEntry.objects.bulk_create([
+            LogEntry(message='page %d' % i, severity=0, ip='127.0.0.1') for i in range(25)
+        ])
+        LogEntry.objects.update(created=now)
+
+        user = self.template_users['staff_user']
+        self.client.login(email=user['email'], password=user['password'])
+
+        seen = []
+        url = reverse('api:log-list') + '?pagination=cursor&limit=10'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertNotIn('count', response.data)
+            seen += [e['id'] for e in response.data['results']]
+            url = response.data['next']
+
+        self.assertEqual(sorted(seen), sorted(LogEntry.objects.values_list('id', flat=True)))
+
+    def test_bulk(self):
+        """Log entries can be posted in batches as JSON or NDJSON."""
+        url = reverse('api:log-bulk')
+        entries = [{'message': 'bulk %d' % i, 'severity': i % 5, 'category': 'bulk'} for i in range(20)]
+
+        with self.assertNumQueries(1):
+            response = self.client.post(url, entries, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['created'], 20)
+        self.assertEqual(LogEntry.objects.filter(category='bulk', user__isnull=True).count(), 20)
+
+        body = '\n'.join(json.dumps(e) for e in entries)
+        response = self.client.post(url, body, content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(LogEntry.objects.filter(category='bulk').count(), 40)
+
+        # Nothing is saved if any entry is invalid
+        response = self.client.post(url, entries + [{'message': 'bad', 'severity': 99}], format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(LogEntry.objects.filter(category='bulk').count(), 40)
+
+    @override_settings(LOGGER_BUFFER=True)
+    def test_bulk_buffered(self):
+        url = reverse('api:log-bulk')
+        response = self.client.post(url, [{'message': 'buffered', 'severity': 0}], format='json')
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+
+        self.assertEqual(get_buffer().flush(), 1)
+        self.assertEqual(LogEntry.objects.filter(message='buffered').count(), 1)
+
+    def test_prune(self):
+        """Old log entries are removed by dropping partitions and deleting in chunks."""
+        old = timezone.now() - datetime.timedelta(days=400)
+        LogEntry.objects.bulk_create([
+            LogEntry(message='old %d' % i, severity=i % 5, ip='127.0.0.1') for i in range(10)
+        ])
+        LogEntry.objects.filter(message__startswith='old').update(created=old)
+
+        # Move the oldest entries to their own partition
+        self.assertTrue(partitions.create_partition(old))
+        self.assertIn(partitions.partition_name(partitions.month_start(old)), [p[0] for p in partitions.partitions()])
+
+        # Only low severity entries
+        call_command('prunelogs', days=365, max_severity=LogEntry.INFO, chunk_size=3, verbosity=0)
+        self.assertEqual(LogEntry.objects.filter(message__startswith='old').count(), 4)
+
+        call_command('prunelogs', days=365, verbosity=0)
+        self.assertEqual(LogEntry.objects.filter(message__startswith='old').count(), 0)
+        self.assertNotIn(partitions.partition_name(partitions.month_start(old)), [p[0] for p in partitions.partitions()])
+        self.assertEqual(LogEntry.objects.count(), self.object_count)
@@ -3,9 +3,15 @@ from rest_framework.permissions import AllowAny
 from rest_framework.decorators import list_route
 from rest_framework.response import Response
 from rest_framework.exceptions import PermissionDenied
+from rest_framework.parsers import JSONParser
+from django.conf import settings
 
 from logger.models import LogEntry
 from logger.serializers import LogEntrySerializer, LogEntryFilterSet, BulkEraseSerializer
+from logger.parsers import NDJSONParser
+from logger.buffer import get_buffer
+from logger import partitions
+from palvelutori.pagination import OptionalCursorPagination
 
 class LogEntryViewSet(mixins.CreateModelMixin,
                       mixins.RetrieveModelMixin,
@@ -17,8 +23,13 @@ class LogEntryViewSet(mixins.CreateModelMixin,
     Authenticated users can create and see their own entries.
     Users with the 'see_all' permission can see all log entries.
     Users with the delete permission may use the bulk delete command.
+    Log entries can be created in batches with the bulk command.
+
+    Use ?pagination=cursor for cursor based paging, which is faster for
+    deep pages. Follow the "next" and "previous" links to get more pages.
     """
     permission_classes = [AllowAny]
+    pagination_class = OptionalCursorPagination
     filter_backends = (filters.DjangoFilterBackend,)
     filter_class = LogEntryFilterSet
 
@@ -35,6 +46,41 @@ class LogEntryViewSet(mixins.CreateModelMixin,
 
         return LogEntrySerializer
 
+    @list_route(methods=['post'], parser_classes=[JSONParser, NDJSONParser])
+    def bulk(self, request):
+        """Create log entries in bulk.
+
+        The request body is either a JSON array of log entries or
+        newline delimited JSON (Content-Type: application/x-ndjson)
+        with one entry per line. The batch is saved only if every
+        entry is valid.
+        ---
+        type:
+            created:
+                required: true
+                type: integer
+        serializer: logger.serializers.LogEntrySerializer
+        omit_serializer: false
+        """
+        if isinstance(request.data, list) and len(request.data) > settings.LOGGER_MAX_BATCH_SIZE:
+            return Response({
+                'detail': 'Too many log entries (max. {})'.format(settings.LOGGER_MAX_BATCH_SIZE)
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        serializer = self.get_serializer(data=request.data, many=True)
+        serializer.is_valid(raise_exception=True)
+
+        ip = request.META['REMOTE_ADDR']
+        user = request.user if request.user.is_authenticated() else None
+        entries = [LogEntry(ip=ip, user=user, **d) for d in serializer.validated_data]
+
+        if settings.LOGGER_BUFFER:
+            get_buffer().add(entries)
+            return Response({'accepted': len(entries)}, status=status.HTTP_202_ACCEPTED)
+
+        LogEntry.objects.bulk_create(entries)
+        return Response({'created': len(entries)}, status=status.HTTP_201_CREATED)
+
     @list_route(methods=['post'])
     def erase(self, request):
         """Erase log entries in bulk.
@@ -52,15 +98,9 @@ class LogEntryViewSet(mixins.CreateModelMixin,
         serializer = self.get_serializer(data=request.data)
         
         if serializer.is_valid():
-            d = serializer.data
-            total, models = LogEntry.objects.filter(
-                created__lte=d['before'],
-                severity__lte=d['max_severity']
-                ).delete()
-            
-            # There should be no cascading deletes
-            assert len(models) == 1
-            
+            d = serializer.validated_data
+            total = partitions.delete_entries(d['before'], d['max_severity'])
+
             return Response({
                 'deleted': total
             })
@@ -1,3 +1,8 @@
 from django.contrib import admin
 
-# Register your models here.
+from . import models
+
+@admin.register(models.QueuedMail)
+class QueuedMailAdmin(admin.ModelAdmin):
+    list_display = ('created', 'subject', 'sender', 'sent', 'failed', 'attempts', 'next_attempt')
+    list_filter = ('failed',)
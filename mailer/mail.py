@@ -4,13 +4,16 @@ Email sending utilities
 
 from __future__ import absolute_import, unicode_literals
 
-from django.core.mail import EmailMultiAlternatives
+from django.core.mail import EmailMultiAlternatives, get_connection
 from django.core.urlresolvers import get_script_prefix
 from django.template.loader import get_template
 from django.template import Context, TemplateDoesNotExist
 from django.utils import translation
 from django.conf import settings
 
+from mailer.models import QueuedMail
+
+import os
 import smtplib
 import types
 
@@ -33,6 +36,9 @@ def send_template_mail(recipient, template, variables, sender=None, html=True, s
 
     In case of failure, a log entry is printed and False returned.
 
+    If the MAILER_QUEUE setting is enabled, the message is not sent
+    immediately, but stored in the mail queue (see mailer.models.QueuedMail)
+
     Template name:
 
     The template will be searched from the "email" subdirectory of the template
@@ -53,10 +59,7 @@ def send_template_mail(recipient, template, variables, sender=None, html=True, s
     sender      -- the address of the sender
     """
 
-    if isinstance(recipient, str):
-        recipient = (recipient,)
-    elif isinstance(recipient, types.GeneratorType):
-        recipient = tuple(recipient)
+    recipient = _recipient_tuple(recipient)
 
     if not recipient:
         logger.info("Not sending template mail (%s) to any recipient from %s", template, sender)
@@ -69,6 +72,55 @@ def send_template_mail(recipient, template, variables, sender=None, html=True, s
     logger.info("Sending template mail (%s) to %s from %s in language %s",
         template, list(recipient), sender, lang)
 
+    msg = _render_message(recipient, template, lang, variables, sender, html, subject)
+
+    return _deliver([msg]) == 1
+
+def send_template_mass_mail(messages, template, sender=None, html=True, subject=None):
+    """
+    Send many e-mails using the same template, each with its own context.
+
+    The templates are looked up once and all messages are sent over a
+    single connection (or queued in one go, if MAILER_QUEUE is set.)
+
+    Arguments:
+    messages  -- an iterable of (recipient, variables) tuples. See
+                 send_template_mail for the meaning of these.
+    template  -- the template name to use.
+    sender    -- the sender address.
+    html      -- if set to False, no HTML part will be used even if available.
+    subject   -- if not None, this will be used as the subject of every message.
+
+    Returns the number of messages sent.
+    """
+    sender = sender or getattr(settings, 'DEFAULT_FROM_EMAIL', 'no-reply@sofokus.com')
+    lang = translation.get_language()
+
+    msgs = []
+    for recipient, variables in messages:
+        recipient = _recipient_tuple(recipient)
+        if recipient:
+            msgs.append(_render_message(recipient, template, lang, variables, sender, html, subject))
+
+    logger.info("Sending %d template mails (%s) from %s in language %s",
+        len(msgs), template, sender, lang)
+
+    if not msgs:
+        return 0
+
+    return _deliver(msgs)
+
+def _recipient_tuple(recipient):
+    if isinstance(recipient, str):
+        return (recipient,)
+    elif isinstance(recipient, types.GeneratorType):
+        return tuple(recipient)
+    return recipient
+
+def _render_message(recipient, template, lang, variables, sender, html, subject):
+    """
+    Internal: Render the template into an e-mail message.
+    """
     #siteroot = get_siteroot()
 
     ctx = {
@@ -95,16 +147,72 @@ def send_template_mail(recipient, template, variables, sender=None, html=True, s
     if alttext:
         msg.attach_alternative(alttext, "text/html")
 
+    return msg
+
+def _deliver(msgs):
+    """
+    Internal: Send the messages over one connection, or put them
+    in the mail queue if MAILER_QUEUE is set.
+    Returns the number of messages sent.
+    """
+    if getattr(settings, 'MAILER_QUEUE', False):
+        # The messages will be sent by the sendqueuedmail command
+        QueuedMail.enqueue(*msgs)
+        return len(msgs)
+
     try:
-        msg.send()
+        return get_connection().send_messages(msgs) or 0
     except smtplib.SMTPException as ex:
-        logger.error("Error while sending e-mail to %s: %s", recipient, ex)
-        return False
-    return True
+        logger.error("Error while sending e-mail to %s: %s", [m.to for m in msgs], ex)
+        return 0
+
+# Resolved templates: (name, language, suffix) -> (template, mtime)
+_template_cache = {}
+
+def clear_template_cache():
+    _template_cache.clear()
+
+def _template_mtime(template):
+    """
+    Internal: Get the modification time of the template's source file,
+    or None if not available.
+    """
+    origin = getattr(getattr(template, 'template', template), 'origin', None)
+    try:
+        return os.path.getmtime(origin.name)
+    except (AttributeError, TypeError, OSError):
+        return None
 
 def _get_localized_template(name, language, suffix):
     """
     Internal: Get the best version of the template for the given language.
+    The result is cached. In DEBUG mode, the template is reloaded
+    if its source file changes.
+    """
+    key = (name, language, suffix)
+
+    cached = _template_cache.get(key)
+    if cached is not None:
+        template, mtime = cached
+        if template is None:
+            raise TemplateDoesNotExist("email/{}.{}".format(name, suffix))
+        if not settings.DEBUG or _template_mtime(template) == mtime:
+            return template
+
+    try:
+        template = _find_localized_template(name, language, suffix)
+    except TemplateDoesNotExist:
+        # In DEBUG mode, the template may yet be created
+        if not settings.DEBUG:
+            _template_cache[key] = (None, None)
+        raise
+
+    _template_cache[key] = (template, _template_mtime(template) if settings.DEBUG else None)
+    return template
+
+def _find_localized_template(name, language, suffix):
+    """
+    Internal: Find the best version of the template for the given language.
     The search order is:
     template_XX-XX.suffix
     template_XX.suffix
@@ -120,9 +228,9 @@ def _get_localized_template(name, language, suffix):
         if not language:
             raise
         elif '-' in language:
-            return _get_localized_template(name, language.split('-')[0], suffix)
+            return _find_localized_template(name, language.split('-')[0], suffix)
         else:
-            return _get_localized_template(name, '', suffix)
+            return _find_localized_template(name, '', suffix)
 
 def send_template_admin_mail(subject, template, variables):
     """
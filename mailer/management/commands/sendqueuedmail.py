@@ -0,0 +1,96 @@
+from django.core.management.base import BaseCommand
+from django.core.mail import get_connection
+from django.utils import timezone
+
+from mailer.models import QueuedMail
+
+import datetime
+import time
+
+import logging
+logger = logging.getLogger(__name__)
+
+class Command(BaseCommand):
+    help = "Send queued e-mail messages"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', action='store', type=int, default=100, dest='batch_size',
+                            help='How many messages to send over one connection')
+        parser.add_argument('--max-attempts', action='store', type=int, default=10, dest='max_attempts',
+                            help='Give up on a message after this many failed attempts')
+        parser.add_argument('--retry-delay', action='store', type=int, default=60, dest='retry_delay',
+                            help='Delay (in seconds) before the first retry. Doubles on every attempt.')
+        parser.add_argument('--lease', action='store', type=int, default=600, dest='lease',
+                            help='Seconds a claimed batch is reserved for this process before other senders may retry it')
+        parser.add_argument('--loop', action='store', type=int, default=0, dest='loop',
+                            help='Keep running and poll the queue every LOOP seconds')
+
+    def handle(self, *args, **options):
+        self.verbosity = int(options.get('verbosity'))
+        self.batch_size = options['batch_size']
+        self.max_attempts = options['max_attempts']
+        self.retry_delay = options['retry_delay']
+        self.lease = datetime.timedelta(seconds=options['lease'])
+
+        loop = options['loop']
+
+        while True:
+            # Send batches until the queue is empty
+            while self.send_batch() == self.batch_size:
+                pass
+
+            if not loop:
+                break
+            time.sleep(loop)
+
+    def send_batch(self):
+        """Send a batch of pending messages over a single connection.
+        Returns the number of messages processed.
+
+        The batch is claimed first, so concurrent senders (such as a cron
+        run overlapping --loop) never send the same messages.
+        """
+        batch = QueuedMail.claim(self.batch_size, self.lease)
+        if not batch:
+            return 0
+
+        sent = 0
+        connection = get_connection()
+        try:
+            connection.open()
+        except Exception as ex:
+            logger.error("Could not connect to mail server: %s", ex)
+            for mail in batch:
+                self.failed(mail, ex)
+            return len(batch)
+
+        try:
+            for mail in batch:
+                try:
+                    connection.send_messages([mail.to_message(connection=connection)])
+                except Exception as ex:
+                    logger.error("Error while sending e-mail to %s: %s", mail.recipients, ex)
+                    self.failed(mail, ex)
+                else:
+                    mail.sent = timezone.now()
+                    mail.save(update_fields=('sent',))
+                    sent += 1
+        finally:
+            connection.close()
+
+        if self.verbosity > 1:
+            self.stdout.write("Sent {} of {} messages".format(sent, len(batch)))
+
+        return len(batch)
+
+    def failed(self, mail, error):
+        mail.attempts += 1
+        mail.last_error = str(error)
+
+        if mail.attempts >= self.max_attempts:
+            mail.failed = True
+        else:
+            mail.next_attempt = timezone.now() + datetime.timedelta(
+                seconds=self.retry_delay * 2 ** (mail.attempts - 1))
+
+        mail.save(update_fields=('attempts', 'last_error', 'failed', 'next_attempt'))
@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10 on 2026-10-17 12:02
+from __future__ import unicode_literals
+
+import django.contrib.postgres.fields
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QueuedMail',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('sender', models.CharField(max_length=255)),
+                ('recipients', django.contrib.postgres.fields.ArrayField(base_field=models.CharField(max_length=255), size=None)),
+                ('subject', models.TextField()),
+                ('body', models.TextField()),
+                ('html', models.TextField(blank=True)),
+                ('sent', models.DateTimeField(blank=True, null=True)),
+                ('failed', models.BooleanField(default=False, help_text='Sending failed too many times and will not be retried')),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('next_attempt', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+                ('last_error', models.TextField(blank=True)),
+            ],
+            options={
+                'verbose_name': 'queued mail',
+                'verbose_name_plural': 'queued mail',
+            },
+        ),
+    ]
@@ -1,5 +1,94 @@
 from __future__ import unicode_literals
 
-from django.db import models
+from django.db import connection, models
+from django.contrib.postgres.fields import ArrayField
+from django.core.mail import EmailMultiAlternatives
+from django.utils import timezone
+from django.utils.encoding import python_2_unicode_compatible
 
-# Create your models here.
+@python_2_unicode_compatible
+class QueuedMail(models.Model):
+    """An outgoing e-mail message waiting to be sent by the
+    sendqueuedmail management command.
+    """
+    created = models.DateTimeField(auto_now_add=True)
+
+    sender = models.CharField(max_length=255)
+    recipients = ArrayField(models.CharField(max_length=255))
+    subject = models.TextField()
+    body = models.TextField()
+    html = models.TextField(blank=True)
+
+    sent = models.DateTimeField(blank=True, null=True)
+    failed = models.BooleanField(default=False, help_text="Sending failed too many times and will not be retried")
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt = models.DateTimeField(default=timezone.now, db_index=True)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        verbose_name = 'queued mail'
+        verbose_name_plural = 'queued mail'
+
+    def __str__(self):
+        return '{} -> {}: {}'.format(self.sender, ', '.join(self.recipients), self.subject)
+
+    @classmethod
+    def pending(cls):
+        """Messages due to be sent, oldest first."""
+        return cls.objects.filter(
+            sent__isnull=True,
+            failed=False,
+            next_attempt__lte=timezone.now()
+        ).order_by('next_attempt', 'id')
+
+    @classmethod
+    def claim(cls, count, lease):
+        """Claim up to count pending messages for sending, oldest first.
+
+        The next attempt of the claimed messages is postponed by lease
+        (a timedelta), so concurrent senders skip them. Messages that are
+        neither sent nor failed by then, for example because the sender
+        died, become pending again.
+        """
+        now = timezone.now()
+        with connection.cursor() as cursor:
+            cursor.execute("""
+                UPDATE {table} SET next_attempt = %s
+                WHERE id IN (
+                    SELECT id FROM {table}
+                    WHERE sent IS NULL AND NOT failed AND next_attempt <= %s
+                    ORDER BY next_attempt, id
+                    LIMIT %s
+                    FOR UPDATE SKIP LOCKED
+                )
+                RETURNING id
+                """.format(table=cls._meta.db_table), [now + lease, now, count])
+            ids = [row[0] for row in cursor.fetchall()]
+
+        return list(cls.objects.filter(pk__in=ids).order_by('id'))
+
+    @classmethod
+    def enqueue(cls, *msgs):
+        """Put EmailMultiAlternatives messages in the queue."""
+        return cls.objects.bulk_create([cls.from_message(msg) for msg in msgs])
+
+    @classmethod
+    def from_message(cls, msg):
+        html = ''
+        for content, mimetype in getattr(msg, 'alternatives', []):
+            if mimetype == 'text/html':
+                html = content
+
+        return cls(
+            sender=msg.from_email,
+            recipients=list(msg.to),
+            subject=msg.subject,
+            body=msg.body,
+            html=html,
+        )
+
+    def to_message(self, connection=None):
+        msg = EmailMultiAlternatives(self.subject, self.body, self.sender, self.recipients, connection=connection)
+        if self.html:
+            msg.attach_alternative(self.html, "text/html")
+        return msg
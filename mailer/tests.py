@@ -1,12 +1,22 @@
 from __future__ import unicode_literals
 
 from unittest import skipIf
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from django.core import mail
-from django.utils import translation
+from django.core.mail.backends.base import BaseEmailBackend
+from django.core.management import call_command
+from django.utils import translation, timezone
 from django.conf import settings
 
-from mailer.mail import send_template_mail, send_template_admin_mail, send_template_manager_mail
+from mailer import mail as mailer_mail
+from mailer.mail import send_template_mail, send_template_mass_mail, send_template_admin_mail, send_template_manager_mail
+from mailer.models import QueuedMail
+
+import datetime
+
+class FailingBackend(BaseEmailBackend):
+    def send_messages(self, messages):
+        raise IOError("Mail server is down")
 
 class MailerTest(TestCase):
     def test_mail(self):
@@ -30,6 +40,46 @@ class MailerTest(TestCase):
         self.assertEqual(mail.outbox[2].subject, 'Mailer test subject: "moi"')
         self.assertEqual(mail.outbox[2].body.strip(), "Postitesti: 'moi'")
 
+    def test_template_cache(self):
+        lookups = []
+        get_template = mailer_mail.get_template
+
+        def counting_get_template(name):
+            lookups.append(name)
+            return get_template(name)
+
+        mailer_mail.clear_template_cache()
+        mailer_mail.get_template = counting_get_template
+        try:
+            with translation.override('en'):
+                for i in range(5):
+                    send_template_mail('test@example.com', 'test', {'var': i})
+
+            count = len(lookups)
+            self.assertTrue(count > 0)
+
+            with translation.override('en'):
+                send_template_mail('test@example.com', 'test', {'var': 'again'})
+
+            # Resolved (and missing) templates are not looked up again
+            self.assertEqual(len(lookups), count)
+        finally:
+            mailer_mail.get_template = get_template
+
+        self.assertEqual(len(mail.outbox), 6)
+        self.assertEqual(mail.outbox[4].body.strip(), "Mailer test: '4'")
+
+    def test_mass_mail(self):
+        with translation.override('fi'):
+            sent = send_template_mass_mail(
+                [('a@example.com', {'var': 'a'}), ('b@example.com', {'var': 'b'}), ([], {'var': 'nobody'})],
+                'test')
+
+        self.assertEqual(sent, 2)
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertEqual(mail.outbox[0].to, ['a@example.com'])
+        self.assertEqual(mail.outbox[1].body.strip(), "Postitesti: 'b'")
+
     @skipIf(not settings.ADMINS, "no admins configured")
     def test_admin_mail(self):
         send_template_admin_mail('admin test', 'test', {})
@@ -41,3 +91,74 @@ class MailerTest(TestCase):
         send_template_manager_mail('manager test', 'test', {})
 
         self.assertEqual(len(mail.outbox), 1)
+
+
+@override_settings(MAILER_QUEUE=True)
+class MailQueueTest(TestCase):
+    def test_queue(self):
+        with translation.override('en'):
+            send_template_mail('test@example.com', 'test', {'var': 'hello'})
+            send_template_mail(['a@example.com', 'b@example.com'], 'test', {'var': 'world'})
+
+        # Nothing is sent during the request
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(QueuedMail.pending().count(), 2)
+
+        call_command('sendqueuedmail', batch_size=1)
+
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertEqual(QueuedMail.pending().count(), 0)
+        self.assertEqual(mail.outbox[0].subject, 'Mailer test subject: "hello"')
+        self.assertEqual(mail.outbox[0].body.strip(), "Mailer test: 'hello'")
+        self.assertEqual(mail.outbox[1].to, ['a@example.com', 'b@example.com'])
+
+        # Sent messages are not sent again
+        call_command('sendqueuedmail')
+        self.assertEqual(len(mail.outbox), 2)
+
+    def test_claim(self):
+        with translation.override('en'):
+            for i in range(3):
+                send_template_mail('test@example.com', 'test', {'var': i})
+
+        lease = datetime.timedelta(minutes=10)
+        claimed = QueuedMail.claim(2, lease)
+        self.assertEqual(len(claimed), 2)
+
+        # Claimed messages are not claimed or sent by another sender
+        self.assertEqual([m.pk for m in QueuedMail.claim(2, lease)],
+                         [m.pk for m in QueuedMail.objects.exclude(pk__in=[m.pk for m in claimed])])
+        self.assertEqual(QueuedMail.claim(2, lease), [])
+        call_command('sendqueuedmail')
+        self.assertEqual(len(mail.outbox), 0)
+
+        # Unfinished claims expire
+        QueuedMail.objects.update(next_attempt=timezone.now() - datetime.timedelta(seconds=1))
+        call_command('sendqueuedmail')
+        self.assertEqual(len(mail.outbox), 3)
+
+    def test_retry(self):
+        with translation.override('en'):
+            send_template_mail('test@example.com', 'test', {'var': 'hello'})
+
+        with override_settings(EMAIL_BACKEND='mailer.tests.FailingBackend'):
+            call_command('sendqueuedmail', max_attempts=2)
+
+        queued = QueuedMail.objects.get()
+        self.assertEqual(queued.attempts, 1)
+        self.assertFalse(queued.failed)
+        self.assertIsNone(queued.sent)
+        self.assertTrue(queued.next_attempt > timezone.now())
+
+        # Not due yet
+        call_command('sendqueuedmail')
+        self.assertEqual(len(mail.outbox), 0)
+
+        QueuedMail.objects.update(next_attempt=timezone.now() - datetime.timedelta(seconds=1))
+        with override_settings(EMAIL_BACKEND='mailer.tests.FailingBackend'):
+            call_command('sendqueuedmail', max_attempts=2)
+
+        queued = QueuedMail.objects.get()
+        self.assertEqual(queued.attempts, 2)
+        self.assertTrue(queued.failed)
+        self.assertEqual(QueuedMail.pending().count(), 0)
@@ -2,6 +2,12 @@ from django.contrib import admin
 
 from . import models
 
+class ImageDerivativeInline(admin.TabularInline):
+    model = models.ImageDerivative
+    readonly_fields = ('name', 'image', 'width', 'height')
+    extra = 0
+
 @admin.register(models.Image)
 class ImageAdmin(admin.ModelAdmin):
     list_display = ('sha256', 'image', 'width', 'height', 'added')
+    inlines = [ImageDerivativeInline]
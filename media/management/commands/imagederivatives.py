@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from media.models import Image
+
+class Command(BaseCommand):
+    help = "Create missing image derivatives (see IMAGE_DERIVATIVES)"
+
+    def handle(self, *args, **options):
+        self.verbosity = int(options.get('verbosity'))
+
+        count = 0
+        for image in Image.objects.iterator():
+            created = image.create_derivatives()
+            count += len(created)
+            if created and self.verbosity > 1:
+                self.stdout.write('{} {}'.format(image.image.name, ', '.join(d.name for d in created)))
+
+        if self.verbosity > 0:
+            self.stdout.write("Created {} derivatives".format(count))
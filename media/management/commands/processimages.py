@@ -0,0 +1,80 @@
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from media.models import Image
+
+import datetime
+import multiprocessing
+import time
+
+import logging
+logger = logging.getLogger(__name__)
+
+def process_image(image_id):
+    """Process one pending image. Runs in a worker process."""
+    try:
+        image = Image.objects.get(pk=image_id, status=Image.PENDING)
+    except Image.DoesNotExist:
+        return image_id, None
+
+    try:
+        return image_id, image.process().status
+    except Exception as ex:
+        logger.error("Could not process image %d: %s", image_id, ex)
+        return image_id, Image.FAILED
+
+class Command(BaseCommand):
+    help = "Process pending uploaded images (see MEDIA_PROCESS_ASYNC)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', action='store', type=int, default=multiprocessing.cpu_count(), dest='workers',
+                            help='Number of worker processes (0 processes the images in this process)')
+        parser.add_argument('--batch-size', action='store', type=int, default=100, dest='batch_size',
+                            help='How many images to queue for the workers at a time')
+        parser.add_argument('--lease', action='store', type=int, default=600, dest='lease',
+                            help='Seconds claimed images are reserved for this process before other runs may retry them')
+        parser.add_argument('--loop', action='store', type=int, default=0, dest='loop',
+                            help='Keep running and poll for new images every LOOP seconds')
+
+    def handle(self, *args, **options):
+        self.verbosity = int(options.get('verbosity'))
+        batch_size = options['batch_size']
+        workers = options['workers']
+        loop = options['loop']
+        lease = datetime.timedelta(seconds=options['lease'])
+
+        pool = None
+        if workers > 0:
+            # The worker processes are started right away, so they
+            # do not inherit the database connection
+            connections.close_all()
+            pool = multiprocessing.Pool(workers)
+
+        try:
+            while True:
+                while True:
+                    # Claimed images are skipped by concurrent runs
+                    batch = Image.claim_pending(batch_size, lease)
+                    if not batch:
+                        break
+
+                    if pool is not None:
+                        results = pool.imap_unordered(process_image, batch)
+                    else:
+                        results = map(process_image, batch)
+
+                    for image_id, status in results:
+                        if self.verbosity > 1:
+                            self.stdout.write("Image {} {}".format(image_id, status))
+
+                    # Claimed images are not claimed again, so this always progresses
+                    if len(batch) < batch_size:
+                        break
+
+                if not loop:
+                    break
+                time.sleep(loop)
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10 on 2026-10-17 13:40
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('media', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImageDerivative',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=32)),
+                ('image', models.FileField(max_length=255, upload_to='images/derived')),
+                ('width', models.PositiveIntegerField(default=0)),
+                ('height', models.PositiveIntegerField(default=0)),
+                ('original', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='derivatives', to='media.Image')),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='imagederivative',
+            unique_together=set([('original', 'name')]),
+        ),
+    ]
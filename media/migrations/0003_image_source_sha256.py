@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10 on 2026-10-17 14:05
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('media', '0002_imagederivative'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='image',
+            name='source_sha256',
+            field=models.CharField(blank=True, db_index=True, help_text='Hash of the uploaded file', max_length=64),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10 on 2026-10-17 14:30
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('media', '0003_image_source_sha256'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='image',
+            name='status',
+            field=models.CharField(choices=[('ready', 'Ready'), ('pending', 'Pending'), ('failed', 'Failed')], db_index=True, default='ready', help_text='Pending images have not been processed yet (see the processimages command)', max_length=10),
+        ),
+    ]
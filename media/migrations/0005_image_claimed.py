@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10 on 2026-10-17 18:10
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('media', '0004_image_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='image',
+            name='claimed',
+            field=models.DateTimeField(blank=True, help_text='When processing of the pending image was last started', null=True),
+        ),
+    ]
@@ -1,7 +1,9 @@
 from __future__ import unicode_literals
 
-from django.db import models
+from django.db import connection, models, transaction
+from django.db.models import Q
 from django.conf import settings
+from django.utils import timezone
 from django.core.files.uploadedfile import InMemoryUploadedFile
 
 from PIL import Image as PillowImage
@@ -11,10 +13,79 @@ import hashlib
 
 class ImageError(Exception):
     pass
+
+HASH_CHUNK_SIZE = 64 * 1024
+
+def _file_hash(f):
+    """Calculate the SHA-256 hash of the file's contents."""
+    f.seek(0)
+    m = hashlib.sha256()
+    while True:
+        chunk = f.read(HASH_CHUNK_SIZE)
+        if not chunk:
+            break
+        m.update(chunk)
+    return m.hexdigest()
+
+def _open_image(sourcefile):
+    """Open the image and check its format. This only reads the header.
+    Returns the image and its format.
+    """
+    sourcefile.seek(0)
+    image = PillowImage.open(sourcefile)
+    fmt = image.format.lower()
+
+    if fmt not in settings.ACCEPTED_IMAGE_FORMATS:
+        raise ImageError("Unsupported image format (" + fmt + ")")
+
+    return image, fmt
+
+def _downscale(sourcefile, source_hash, image):
+    """Downscale the image if it is larger than MAX_IMAGE_SIZE.
+
+    Returns the file to store, its length and its hash.
+    """
+    width, height = image.size
+
+    if width > settings.MAX_IMAGE_SIZE[0] or height > settings.MAX_IMAGE_SIZE[1]:
+        # JPEG images can be scaled down while decoding, which is much faster
+        image.draft(image.mode, settings.MAX_IMAGE_SIZE)
+        image.thumbnail(settings.MAX_IMAGE_SIZE)
+
+        imgdata = BytesIO()
+        image.save(imgdata, image.format)
+        return imgdata, imgdata.tell(), _file_hash(imgdata)
+
+    sourcefile.seek(0, SEEK_END)
+    return sourcefile, sourcefile.tell(), source_hash
+
+def _uploaded_file(f, name, fmt, datalen):
+    f.seek(0)
+    return InMemoryUploadedFile(
+        file=f,
+        field_name='image',
+        name=name,
+        content_type='image/' + fmt,
+        size=datalen,
+        charset=None,
+        content_type_extra=None
+        )
+
 class Image(models.Model):
     """Common store for uploaded images."""
 
+    READY = 'ready'
+    PENDING = 'pending'
+    FAILED = 'failed'
+    STATUS_CHOICES = (
+        (READY, 'Ready'),
+        (PENDING, 'Pending'),
+        (FAILED, 'Failed'),
+    )
+
     sha256 = models.CharField(max_length=64, unique=True)
+    source_sha256 = models.CharField(max_length=64, blank=True, db_index=True,
+                                     help_text="Hash of the uploaded file")
     image = models.FileField(
         upload_to="images",
         max_length=255
@@ -22,6 +93,10 @@ class Image(models.Model):
     width = models.PositiveIntegerField(default=0)
     height = models.PositiveIntegerField(default=0)
     added  = models.DateTimeField(auto_now_add=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=READY, db_index=True,
+                              help_text="Pending images have not been processed yet (see the processimages command)")
+    claimed = models.DateTimeField(blank=True, null=True,
+                                   help_text="When processing of the pending image was last started")
 
     @staticmethod
     def save_or_get(sourcefile):
@@ -29,63 +104,274 @@ class Image(models.Model):
         
         The image is downscaled if too large. 
 
-        If the exact same image is found, return it instead.
+        If the exact same image (or an image uploaded from the exact same
+        file) is found, return it instead. This is checked before the
+        image is decoded.
         """
-        
-        # First, make sure the uploaded file is an image file of acceptable type
-        image = PillowImage.open(sourcefile)
 
-        width, height = image.size
-        fmt = image.format.lower()
-        
-        if fmt not in settings.ACCEPTED_IMAGE_FORMATS:
-            raise ImageError("Unsupported image format (" + fmt + ")")
+        # Look for a previous upload of the same file
+        source_hash = _file_hash(sourcefile)
+        existing = Image._find_upload(source_hash)
+        if existing is not None:
+            return existing
 
-        # If image is too big, downscale it
-        if width > settings.MAX_IMAGE_SIZE[0] or height > settings.MAX_IMAGE_SIZE[1]:
-            image.thumbnail(settings.MAX_IMAGE_SIZE)
-            width, height = image.size
+        image, fmt = _open_image(sourcefile)
+        imgdata, datalen, m = _downscale(sourcefile, source_hash, image)
 
-            imgdata = BytesIO()
-            image.save(imgdata, image.format)
-            datalen = imgdata.tell()
-        
-        else:
-            imgdata = sourcefile
-            imgdata.seek(0, SEEK_END)
-            datalen = imgdata.tell()
+        # The downscaled image may still be a duplicate
+        if m != source_hash:
+            try:
+                return Image.objects.get(sha256=m)
+            except Image.DoesNotExist:
+                pass
 
-        # Generate hash
-        imgdata.seek(0)
-        m = hashlib.new('sha256')
-        while True:
-            chunk = imgdata.read(1024)
-            if not chunk:
-                break
-            m.update(chunk)
-        m = m.hexdigest()
-        
-        # See if this image has already been uploaded
-        try:
-            return Image.objects.get(sha256=m)
-        except Image.DoesNotExist:
-            pass
-        
-        # Save image
+        # Decode the image for the derivatives before the file is stored
         sourcefile.seek(0)
+        image.load()
+
+        img = Image.objects.create(
+            sha256=m,
+            source_sha256=source_hash,
+            image=_uploaded_file(imgdata, m + '.' + fmt, fmt, datalen),
+            width=image.size[0],
+            height=image.size[1],
+        )
+        img.create_derivatives(image)
+        return img
+
+    @staticmethod
+    def save_or_queue(sourcefile):
+        """Save the image and return the model.
+
+        If MEDIA_PROCESS_ASYNC is set, the uploaded file is only checked
+        and stored as a pending image, to be processed later by the
+        processimages command. Otherwise, this is the same as save_or_get.
+        """
+        if not settings.MEDIA_PROCESS_ASYNC:
+            return Image.save_or_get(sourcefile)
+
+        source_hash = _file_hash(sourcefile)
+        existing = Image._find_upload(source_hash)
+        if existing is not None:
+            return existing
+
+        image, fmt = _open_image(sourcefile)
+
+        sourcefile.seek(0, SEEK_END)
+        datalen = sourcefile.tell()
+        sourcefile.seek(0)
+
+        return Image.objects.create(
+            sha256=source_hash,
+            source_sha256=source_hash,
+            image=_uploaded_file(sourcefile, 'pending_' + source_hash + '.' + fmt, fmt, datalen),
+            width=image.size[0],
+            height=image.size[1],
+            status=Image.PENDING,
+        )
+
+    @staticmethod
+    def _find_upload(source_hash):
+        return Image.objects.filter(Q(sha256=source_hash) | Q(source_sha256=source_hash)).first()
+
+    @classmethod
+    def pending(cls):
+        return cls.objects.filter(status=cls.PENDING).order_by('id')
+
+    @classmethod
+    def claim_pending(cls, count, lease):
+        """Claim up to count pending images for processing, oldest first.
+
+        Claimed images are skipped by concurrent callers until lease (a
+        timedelta) has passed, after which images that are still pending,
+        for example because the processing process died, are claimed again.
+
+        Returns the IDs of the claimed images.
+        """
+        now = timezone.now()
+        with connection.cursor() as cursor:
+            cursor.execute("""
+                UPDATE {table} SET claimed = %s
+                WHERE id IN (
+                    SELECT id FROM {table}
+                    WHERE status = %s AND (claimed IS NULL OR claimed <= %s)
+                    ORDER BY id
+                    LIMIT %s
+                    FOR UPDATE SKIP LOCKED
+                )
+                RETURNING id
+                """.format(table=cls._meta.db_table), [now, cls.PENDING, now - lease, count])
+            return sorted(row[0] for row in cursor.fetchall())
+
+    def _lock_pending(self):
+        """Lock this image's row until the end of the transaction.
+        Returns False if the image is no longer pending."""
+        return Image.objects.select_for_update().filter(pk=self.pk, status=Image.PENDING).exists()
+
+    def process(self):
+        """Process a pending image.
+
+        If the processed image turns out to be a duplicate, references to
+        this image are moved to the existing one and this image is deleted.
+
+        Returns the processed image.
+        """
+        assert self.status == Image.PENDING
+
+        self.image.open('rb')
+        try:
+            sourcefile = BytesIO(self.image.read())
+        finally:
+            self.image.close()
+
+        try:
+            image, fmt = _open_image(sourcefile)
+            imgdata, datalen, m = _downscale(sourcefile, self.source_sha256, image)
+            sourcefile.seek(0)
+            image.load()
+        except Exception:
+            self._mark_failed()
+            raise
+
+        duplicate = Image.objects.filter(sha256=m).exclude(pk=self.pk).first()
+        if duplicate is not None:
+            try:
+                self._replace_with(duplicate)
+            except Exception:
+                self._mark_failed()
+                raise
+            return duplicate
+
+        pending_file = self.image.name
+        self.image.save(m + '.' + fmt, _uploaded_file(imgdata, m + '.' + fmt, fmt, datalen), save=False)
+
+        # The pending file is only removed once the row no longer refers to it
+        try:
+            with transaction.atomic():
+                if not self._lock_pending():
+                    raise ImageError("Image %d was processed concurrently" % self.pk)
+
+                self.sha256 = m
+                self.width, self.height = image.size
+                self.status = Image.READY
+                self.save()
+        except Exception:
+            self.image.storage.delete(self.image.name)
+            raise
+        transaction.on_commit(lambda: self.image.storage.delete(pending_file))
+
+        self.create_derivatives(image)
+        return self
+
+    def _mark_failed(self):
+        """Mark the image as failed, unless it was processed concurrently."""
+        with transaction.atomic():
+            if self._lock_pending():
+                self.status = Image.FAILED
+                self.save(update_fields=['status'])
+
+    def _replace_with(self, other):
+        """Point the pictures that refer to this image to the other one
+        and delete this image."""
+        # Imported here, since organisation depends on media
+        from organisation.models import Picture, bump_company_versions
+
+        storage, name = self.image.storage, self.image.name
+
+        with transaction.atomic():
+            if not self._lock_pending():
+                raise ImageError("Image %d was processed concurrently" % self.pk)
+
+            pictures = Picture.objects.filter(image=self)
+            company_ids = set(pictures.values_list('company_id', flat=True))
+            pictures.update(image=other)
+            bump_company_versions(*company_ids)
+
+            self.delete()
+            transaction.on_commit(lambda: storage.delete(name))
+
+    def create_derivatives(self, image=None):
+        """Create the missing derivatives (see IMAGE_DERIVATIVES.)
+
+        Derivatives are not created for sizes the image already fits in.
+
+        Arguments:
+        image -- the decoded image, if already available
+        """
+        existing = set(self.derivatives.values_list('name', flat=True))
+        created = []
+
+        for name, size in settings.IMAGE_DERIVATIVES:
+            if name in existing or (self.width <= size[0] and self.height <= size[1]):
+                continue
+
+            if image is None:
+                self.image.open('rb')
+                try:
+                    image = PillowImage.open(self.image)
+                    image.load()
+                finally:
+                    self.image.close()
+
+            created.append(ImageDerivative.create_from(self, name, image, size))
+
+        return created
+
+    def get_sizes(self):
+        """Return the derivatives and the original image by name.
+
+        Sizes the image has no derivative for use the original.
+        """
+        derivatives = {d.name: d for d in self.derivatives.all()}
+        sizes = {name: derivatives.get(name, self) for name, _ in settings.IMAGE_DERIVATIVES}
+        sizes['full'] = self
+        return sizes
+
+
+class ImageDerivative(models.Model):
+    """A downscaled version of an image."""
+
+    original = models.ForeignKey(Image, on_delete=models.CASCADE, related_name='derivatives')
+    name = models.CharField(max_length=32)
+    image = models.FileField(
+        upload_to="images/derived",
+        max_length=255
+        )
+    width = models.PositiveIntegerField(default=0)
+    height = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = (('original', 'name'),)
+
+    @staticmethod
+    def create_from(original, name, image, size):
+        fmt = image.format or original.image.name.rsplit('.', 1)[-1].upper()
+
+        image = image.copy()
+        image.thumbnail(size, PillowImage.ANTIALIAS)
+
+        imgdata = BytesIO()
+        if fmt.lower() in ('jpeg', 'jpg'):
+            image.save(imgdata, fmt, quality=85, optimize=True)
+        else:
+            image.save(imgdata, fmt)
+        datalen = imgdata.tell()
+        imgdata.seek(0)
+
         uploadedfile = InMemoryUploadedFile(
             file=imgdata,
             field_name='image',
-            name=m + '.' + fmt,
-            content_type='image/' + fmt,
+            name='{}_{}.{}'.format(original.sha256, name, fmt.lower()),
+            content_type='image/' + fmt.lower(),
             size=datalen,
             charset=None,
             content_type_extra=None
             )
 
-        return Image.objects.create(
-            sha256=m,
+        return ImageDerivative.objects.create(
+            original=original,
+            name=name,
             image=uploadedfile,
-            width=width,
-            height=height,
+            width=image.size[0],
+            height=image.size[1],
         )
@@ -0,0 +1,12 @@
+from rest_framework.parsers import FileUploadParser
+
+
+class RawImageParser(FileUploadParser):
+    """Parses a request body that is an image file.
+
+    The file is available as request.data['file'].
+    """
+    media_type = 'image/*'
+
+    def get_filename(self, stream, media_type, parser_context):
+        return super(RawImageParser, self).get_filename(stream, media_type, parser_context) or 'upload'
@@ -1,9 +1,17 @@
 from django.test import TestCase
 from django.core.files.uploadhandler import MemoryFileUploadHandler, StopFutureHandlers
 from django.conf import settings
+from django.core.management import call_command
+from django.test import override_settings
+from django.utils import timezone
 
 from media.models import Image
+from organisation.models import Company, Picture
+from palvelutori import test_mixins
 
+from io import BytesIO
+from PIL import Image as PillowImage
+import datetime
 import os
 
 def _getfile(name):
@@ -49,3 +57,91 @@ class ImageTestCase(TestCase):
             img.width == settings.MAX_IMAGE_SIZE[0] or
             img.height == settings.MAX_IMAGE_SIZE[1]
         )
+
+    def test_derivatives(self):
+        img = Image.save_or_get(_getfile('test-big.png'))
+        sizes = img.get_sizes()
+
+        self.assertEqual(sizes['full'], img)
+        for name, (width, height) in settings.IMAGE_DERIVATIVES:
+            derivative = sizes[name]
+            self.assertNotEqual(derivative, img)
+            self.assertTrue(derivative.width <= width and derivative.height <= height)
+            self.assertTrue(derivative.width == width or derivative.height == height)
+            self.assertTrue(derivative.image.size < img.image.size)
+
+        # Derivatives are not recreated
+        self.assertEqual(img.create_derivatives(), [])
+
+        # Small images are not scaled up
+        small = Image.save_or_get(_getfile('test1.png'))
+        self.assertEqual(set(small.get_sizes().values()), {small})
+
+    def test_jpeg_downscaling(self):
+        data = BytesIO()
+        PillowImage.new('RGB', (4000, 3000), (200, 100, 50)).save(data, 'JPEG')
+
+        data.seek(0)
+        img = Image.save_or_get(data)
+        self.assertEqual((img.width, img.height), settings.MAX_IMAGE_SIZE)
+        self.assertNotEqual(img.sha256, img.source_sha256)
+
+        # The same upload is found by the hash of the uploaded file
+        data.seek(0)
+        with self.assertNumQueries(1):
+            self.assertEqual(Image.save_or_get(data).id, img.id)
+
+    @override_settings(MEDIA_PROCESS_ASYNC=True)
+    def test_pending(self):
+        data = BytesIO()
+        PillowImage.new('RGB', (2000, 1000), (10, 20, 30)).save(data, 'JPEG')
+
+        img = Image.save_or_queue(data)
+        self.assertEqual(img.status, Image.PENDING)
+        self.assertEqual((img.width, img.height), (2000, 1000))
+        self.assertEqual(list(Image.pending()), [img])
+
+        # Unsupported files are rejected in the request
+        self.assertRaises(IOError, Image.save_or_queue, BytesIO(b'not an image'))
+
+        # Images claimed by another run are skipped until the claim expires
+        lease = datetime.timedelta(minutes=10)
+        self.assertEqual(Image.claim_pending(10, lease), [img.pk])
+        self.assertEqual(Image.claim_pending(10, lease), [])
+        call_command('processimages', workers=0)
+        self.assertEqual(Image.objects.get(pk=img.pk).status, Image.PENDING)
+
+        Image.objects.filter(pk=img.pk).update(claimed=timezone.now() - lease)
+        call_command('processimages', workers=0)
+
+        img = Image.objects.get(pk=img.pk)
+        self.assertEqual(img.status, Image.READY)
+        self.assertEqual((img.width, img.height), (settings.MAX_IMAGE_SIZE[0], 640))
+        self.assertTrue(img.derivatives.exists())
+        self.assertFalse(Image.pending().exists())
+
+    @override_settings(MEDIA_PROCESS_ASYNC=True)
+    def test_pending_duplicate(self):
+        def upload(compress_level):
+            data = BytesIO()
+            PillowImage.new('RGB', (2000, 1000), (10, 20, 30)).save(data, 'PNG', compress_level=compress_level)
+            return data
+
+        # Different files that are the same image once downscaled
+        existing = Image.save_or_get(upload(9))
+        img = Image.save_or_queue(upload(1))
+        self.assertEqual(img.status, Image.PENDING)
+        self.assertNotEqual(img.pk, existing.pk)
+
+        company = Company.objects.create(name='Test', businessid='1234567-8', service_areas=[])
+        picture = Picture.objects.create(company=company, image=img)
+        pending_file = img.image.name
+
+        call_command('processimages', workers=0)
+        test_mixins.run_commit_hooks()
+
+        # The picture is moved to the existing image and the pending one is removed
+        picture.refresh_from_db()
+        self.assertEqual(picture.image_id, existing.pk)
+        self.assertFalse(Image.objects.filter(pk=img.pk).exists())
+        self.assertFalse(existing.image.storage.exists(pending_file))
@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+# coding=utf-8
+
+"""
+Streaming export of orders.
+
+Orders are read in primary key order, one chunk at a time, so the
+export never holds more than one chunk in memory. (QuerySet.iterator()
+does not help here: psycopg2 fetches the whole result set at once.)
+"""
+
+from __future__ import unicode_literals
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+
+import csv
+import json
+
+# Exported columns, in order
+EXPORT_FIELDS = (
+    'id',
+    'created',
+    'user_first_name',
+    'user_last_name',
+    'user_email',
+    'user_phone',
+    'site_address_street',
+    'site_address_street2',
+    'site_address_postalcode',
+    'site_address_city',
+    'site_address_country',
+    'site_room_count',
+    'site_sanitary_count',
+    'site_floor_count',
+    'site_floor_area',
+    'service_package_shortname',
+    'duration',
+    'price',
+    'timeslot_start',
+    'timeslot_end',
+    'extra_info',
+)
+
+EXPORT_FORMATS = ('csv', 'ndjson')
+
+CHUNK_SIZE = 1000
+
+
+def iter_rows(queryset, chunk_size=CHUNK_SIZE):
+    """Iterate over the export field values of the orders in the queryset."""
+    queryset = queryset.order_by('pk').values_list(*EXPORT_FIELDS)
+    last = None
+    while True:
+        chunk = queryset if last is None else queryset.filter(pk__gt=last)
+        chunk = list(chunk[:chunk_size])
+        for row in chunk:
+            yield row
+        if len(chunk) < chunk_size:
+            break
+        last = chunk[-1][0]
+
+
+class _Echo(object):
+    """A file-like object for csv.writer that returns what is written."""
+    def write(self, value):
+        return value
+
+
+def csv_lines(rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(EXPORT_FIELDS)
+    for row in rows:
+        yield writer.writerow(['' if v is None else v for v in row])
+
+
+def ndjson_lines(rows):
+    encoder = DjangoJSONEncoder()
+    for row in rows:
+        yield encoder.encode(dict(zip(EXPORT_FIELDS, row))) + '\n'
+
+
+def export_response(queryset, export_format, filename):
+    """Get a streaming response with the orders in the given format."""
+    rows = iter_rows(queryset)
+    if export_format == 'ndjson':
+        response = StreamingHttpResponse(ndjson_lines(rows), content_type='application/x-ndjson')
+        filename += '.ndjson'
+    else:
+        response = StreamingHttpResponse(csv_lines(rows), content_type='text/csv; charset=utf-8')
+        filename += '.csv'
+
+    response['Content-Disposition'] = 'attachment; filename="{}"'.format(filename)
+    return response
@@ -4,11 +4,14 @@
 from __future__ import unicode_literals
 
 from django.conf import settings
-from django.db import models
+from django.db import models, transaction
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
 from django.core.validators import MaxValueValidator, MinValueValidator
 from django.utils import timezone
 
 from palvelutori.models import User
+from organisation.models import Company
 from mailer.mail import send_template_mail
 
 from datetime import timedelta
@@ -79,6 +82,25 @@ class Order(models.Model):
 
     rated = models.DateTimeField(blank=True, null=True, editable=False)
 
+    def save(self, *args, **kwargs):
+        """
+        Save the order and keep the company's rating aggregate in sync.
+        """
+        with transaction.atomic():
+            old = None
+            if self.pk is not None:
+                old = Order.objects.select_for_update().filter(pk=self.pk).values('rating', 'company_id').first()
+
+            super(Order, self).save(*args, **kwargs)
+
+            if old is None:
+                Company.update_rating_aggregate(self.company_id, None, self.rating)
+            elif old['company_id'] != self.company_id:
+                Company.update_rating_aggregate(old['company_id'], old['rating'], None)
+                Company.update_rating_aggregate(self.company_id, None, self.rating)
+            else:
+                Company.update_rating_aggregate(self.company_id, old['rating'], self.rating)
+
     def can_be_rated(self):
         """
         An order can be rated only after the timeslot has ended.
@@ -100,3 +122,9 @@ class Order(models.Model):
             {
                 'order': self,
             })
+
+
+@receiver(post_delete, sender=Order)
+def _remove_order_rating(sender, instance, **kwargs):
+    # Sent for every deleted order, including queryset and cascading deletes
+    Company.update_rating_aggregate(instance.company_id, instance.rating, None)
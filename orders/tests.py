@@ -13,8 +13,12 @@ from palvelutori.models import User
 from organisation.models import Company
 from services.models import ServicePackage
 from .models import Order
+from . import export
 
 from copy import deepcopy
+import csv
+import io
+import json
 
 class OrderTest(test_mixins.BasicCRUDApiTestCaseSetupMixin, APITestCase):
 
@@ -159,6 +163,42 @@ class OrderTest(test_mixins.BasicCRUDApiTestCaseSetupMixin, APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(len(response.data['results']), len(self.objects))
 
+    def test_export(self):
+        """
+        Company user should be able to export all of the company's orders
+        """
+        user = self.template_users['normal_user2']
+        self.client.login(email=user['email'], password=user['password'])
+        url = reverse('api:company-orders-export', kwargs={'company_pk': self.company['id']})
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response['Content-Disposition'].endswith('.csv"'))
+        rows = list(csv.reader(io.StringIO(b''.join(response.streaming_content).decode('utf-8'))))
+        self.assertEqual(tuple(rows[0]), export.EXPORT_FIELDS)
+        self.assertEqual(sorted(int(r[0]) for r in rows[1:]), sorted(o.id for o in self.objects))
+        self.assertEqual(rows[1][export.EXPORT_FIELDS.index('site_address_street')], 'Ääkköskatu 3')
+
+        response = self.client.get(url, {'export_format': 'ndjson', 'created__lt': '2000-01-01T00:00:00Z'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(b''.join(response.streaming_content), b'')
+
+        response = self.client.get(url, {'export_format': 'ndjson'})
+        self.assertTrue(response['Content-Disposition'].endswith('.ndjson"'))
+        lines = b''.join(response.streaming_content).decode('utf-8').splitlines()
+        self.assertEqual(len(lines), len(self.objects))
+        self.assertEqual(json.loads(lines[0])['user_email'], 'test@example.com')
+
+        # Chunks are read in primary key order
+        ids = [row[0] for row in export.iter_rows(Order.objects.all(), chunk_size=2)]
+        self.assertEqual(ids, sorted(o.id for o in self.objects))
+
+        # Other users cannot export
+        user = self.template_users['normal_user1']
+        self.client.login(email=user['email'], password=user['password'])
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
     # Retrieve
 
     def test_detail_anonymous(self):
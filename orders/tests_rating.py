@@ -5,6 +5,7 @@ from __future__ import unicode_literals
 
 import datetime
 from django.core.urlresolvers import NoReverseMatch, reverse
+from django.core.management import call_command
 from django.utils import timezone
 from rest_framework import status
 from rest_framework.test import APITestCase
@@ -287,3 +288,38 @@ class OrderRatingTest(test_mixins.BasicCRUDApiTestCaseSetupMixin, APITestCase):
             response = self.client.put(next(urls), data={'rating': 6})
             self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
 
+        def test_rating_aggregate(self):
+            """
+            The company's rating sum and count should follow order ratings
+            and be rebuildable from the orders.
+            """
+            Order.objects.all().update(timeslot_end=timezone.now() - datetime.timedelta(hours=1))
+
+            owner_user = self.template_users['normal_user1']
+            self.client.login(email=owner_user['email'], password=owner_user['password'])
+
+            o1, o2 = Order.objects.all()[:2]
+            url1 = reverse(self.rate_url, kwargs={'pk': o1.pk, 'user_pk': o1.user_id})
+            url2 = reverse(self.rate_url, kwargs={'pk': o2.pk, 'user_pk': o2.user_id})
+
+            self.client.put(url1, data={'rating': 2})
+            self.client.put(url2, data={'rating': 4})
+            company = Company.objects.get(pk=self.company1['id'])
+            self.assertEqual((company.rating_sum, company.rating_count), (6, 2))
+            self.assertEqual(company.rating, 3.0)
+
+            # Changing a rating replaces the old value
+            self.client.put(url1, data={'rating': 5})
+            company = Company.objects.get(pk=self.company1['id'])
+            self.assertEqual((company.rating_sum, company.rating_count), (9, 2))
+
+            # Rebuilding gives the same result
+            Company.objects.all().update(rating_sum=0, rating_count=0)
+            call_command('rebuildratings')
+            company = Company.objects.get(pk=self.company1['id'])
+            self.assertEqual((company.rating_sum, company.rating_count), (9, 2))
+
+            # Deleting an order removes its rating
+            Order.objects.filter(pk=o2.pk).delete()
+            company = Company.objects.get(pk=self.company1['id'])
+            self.assertEqual((company.rating_sum, company.rating_count), (5, 1))
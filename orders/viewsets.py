@@ -8,9 +8,12 @@ from django.utils import timezone
 from rest_framework import viewsets, mixins, filters
 from rest_framework.permissions import IsAuthenticated, SAFE_METHODS
 from rest_framework.filters import OrderingFilter, DjangoFilterBackend
+from rest_framework.decorators import list_route
+from rest_framework.exceptions import ValidationError
 
 from palvelutori.models import User
-from . import models, serializers, permissions, filtersets
+from palvelutori.pagination import OptionalCursorPagination
+from . import models, serializers, permissions, filtersets, export
 
 class BaseOrderMixin(object):
     filter_backends = (filters.DjangoFilterBackend, filters.OrderingFilter)
@@ -71,13 +74,43 @@ class CompanyOrderViewSet(  BaseOrderMixin,
     Possible entries are 'created', 'timeslot_start' and 'timeslot_end'.
     For example: ?ordering=-created, will put the newest first
     Default ordering is '-created'.
+
+    Use ?pagination=cursor for cursor based paging, which is faster for
+    deep pages. Follow the "next" and "previous" links to get more pages.
+
+    All orders can be downloaded with the export command.
     """
     serializer_class = serializers.CompanyOrderSerializer
+    pagination_class = OptionalCursorPagination
     permission_classes = [IsAuthenticated, permissions.IsCompanyUserOrStaff]
 
     def get_queryset(self):
         return models.Order.objects.filter(company_id=self.kwargs['company_pk'], company__active=True)
 
+    @list_route(methods=['get'])
+    def export(self, request, company_pk=None):
+        """Export orders as CSV or newline delimited JSON.
+
+        The same filters as in the order list can be used.
+        Orders are sorted by ID.
+        ---
+        parameters:
+            - name: export_format
+              description: csv (default) or ndjson
+              required: false
+              type: string
+              paramType: query
+        """
+        export_format = request.query_params.get('export_format', 'csv')
+        if export_format not in export.EXPORT_FORMATS:
+            raise ValidationError({'export_format': 'Must be one of: ' + ', '.join(export.EXPORT_FORMATS)})
+
+        return export.export_response(
+            self.filter_queryset(self.get_queryset()),
+            export_format,
+            'orders-{}'.format(company_pk)
+            )
+
 
 class RateOrderViewSet(mixins.UpdateModelMixin, viewsets.GenericViewSet):
     """
@@ -47,6 +47,10 @@ class CompanyAdmin(admin.ModelAdmin):
     inlines = (DescriptionAdmin, AddressAdmin, LinkAdmin, CompanyRatingAdmin)
     list_filter = (YTRCompanyFilter,)
 
+    def save_related(self, request, form, formsets, change):
+        super(CompanyAdmin, self).save_related(request, form, formsets, change)
+        form.instance.update_search_vector()
+
     def has_ytr(self, obj):
         if obj.has_ytr():
             return obj.ytr
@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+# coding=utf-8
+
+"""
+A cache of serialized company representations.
+
+Serializing a company needs its descriptions, links, addresses,
+ratings and pictures. Representations are cached in the "companies"
+cache (see CACHES in settings) by company and language, so listing or
+showing a company that has been shown before only needs the queries for
+the companies themselves and their content versions.
+
+Each cached representation carries the content version of its company
+(see organisation.models.bump_company_versions) it was built from, and
+is only used while that is still the current version. The current
+versions are read from the database, so a cache local to each process
+never serves a representation older than the change another process
+has committed.
+"""
+
+from __future__ import unicode_literals
+
+from django.core.cache import caches
+from django.utils import translation
+
+from organisation.models import company_version_key
+from palvelutori.models import ContentVersion
+
+CACHE_ALIAS = 'companies'
+
+def _cache():
+    return caches[CACHE_ALIAS]
+
+def representation_key(company_id, lang):
+    return 'company:%s:%s' % (company_id, lang)
+
+def get_representations(companies, base_url, serialize):
+    """Get the representations of companies in the active language.
+
+    :param companies: list of companies
+    :param base_url: absolute URL of the site (hyperlinks in the representations depend on it)
+    :param serialize: function returning the representations of a list of companies,
+                      called with the companies that are not cached
+    """
+    # The versions are read before serializing, so a representation is
+    # never older than the version it is stored with
+    versions = ContentVersion.get(*[company_version_key(c.pk) for c in companies])[0]
+
+    lang = translation.get_language()
+    keys = [representation_key(c.pk, lang) for c in companies]
+    cached = _cache().get_many(keys)
+
+    missing = [
+        (key, c, version) for key, c, version in zip(keys, companies, versions)
+        if cached.get(key, (None, None, None))[:2] != (base_url, version)
+    ]
+    if missing:
+        new = {}
+        for (key, c, version), data in zip(missing, serialize([c for key, c, version in missing])):
+            new[key] = (base_url, version, data)
+        _cache().set_many(new)
+        cached.update(new)
+
+    return [cached[key][2] for key in keys]
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from organisation.models import Company
+
+class Command(BaseCommand):
+    help = "Rebuild the denormalized company rating sums and counts from orders"
+
+    def add_arguments(self, parser):
+        parser.add_argument('companies', nargs='?',
+                            help='Rebuild ratings for these companies (default is all)')
+
+    def handle(self, *args, **options):
+        companies = options.get('companies', '')
+        self.verbosity = int(options.get('verbosity'))
+
+        if companies:
+            companies = [int(c) for c in companies.split(',')]
+
+        count = Company.rebuild_rating_aggregates(companies)
+
+        if self.verbosity > 1:
+            self.stdout.write("Rebuilt ratings for {} companies".format(count))
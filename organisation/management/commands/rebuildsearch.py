@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from organisation.search import update_search_vectors
+
+class Command(BaseCommand):
+    help = "Rebuild the full text search vectors of companies"
+
+    def add_arguments(self, parser):
+        parser.add_argument('companies', nargs='?',
+                            help='Rebuild search vectors for these companies (default is all)')
+
+    def handle(self, *args, **options):
+        companies = options.get('companies', '')
+
+        if companies:
+            update_search_vectors([int(c) for c in companies.split(',')])
+        else:
+            update_search_vectors()
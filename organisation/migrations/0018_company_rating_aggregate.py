@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10 on 2026-10-17 09:12
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+def populate_ratings(apps, schema_editor):
+    Company = apps.get_model('organisation', 'Company')
+    Order = apps.get_model('orders', 'Order')
+
+    ratings = Order.objects.filter(rating__isnull=False).values('company').annotate(
+        rating_sum=models.Sum('rating'),
+        rating_count=models.Count('rating'),
+        ).order_by()
+
+    for r in ratings:
+        Company.objects.filter(pk=r['company']).update(
+            rating_sum=r['rating_sum'],
+            rating_count=r['rating_count']
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('organisation', '0017_auto_20160826_1647'),
+        ('orders', '0002_auto_20160523_1611'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='company',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='company',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(populate_ratings, migrations.RunPython.noop),
+    ]
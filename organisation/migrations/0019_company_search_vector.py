@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10 on 2026-10-17 10:03
+from __future__ import unicode_literals
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+def populate_search_vectors(apps, schema_editor):
+    from organisation.search import update_search_vectors
+
+    with schema_editor.connection.cursor() as cursor:
+        update_search_vectors(cursor=cursor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('organisation', '0018_company_rating_aggregate'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='company',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunSQL(
+            ['CREATE INDEX organisation_company_search_vector_gin ON organisation_company USING gin (search_vector)'],
+            ['DROP INDEX organisation_company_search_vector_gin'],
+        ),
+        migrations.RunPython(populate_search_vectors, migrations.RunPython.noop),
+    ]
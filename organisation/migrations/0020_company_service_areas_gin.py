@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10 on 2026-10-17 10:41
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('organisation', '0019_company_search_vector'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            ['CREATE INDEX organisation_company_service_areas_gin ON organisation_company USING gin (service_areas)'],
+            ['DROP INDEX organisation_company_service_areas_gin'],
+        ),
+    ]
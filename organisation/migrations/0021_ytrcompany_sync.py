@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10 on 2026-10-17 15:20
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('organisation', '0020_company_service_areas_gin'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ytrcompany',
+            name='content_hash',
+            field=models.CharField(blank=True, editable=False, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='ytrcompany',
+            name='exported_hash',
+            field=models.CharField(blank=True, editable=False, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='ytrcompany',
+            name='last_seen',
+            field=models.DateTimeField(blank=True, editable=False, help_text='When the company was last seen in YTR', null=True),
+        ),
+    ]
@@ -7,9 +7,17 @@ from django.conf import settings
 from django.utils.translation import ugettext_lazy as _
 from django.utils.encoding import python_2_unicode_compatible
 from django.db import models, transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
 from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MaxValueValidator, MinValueValidator
 
+from palvelutori.models import ContentVersion
+
+import hashlib
+import json
+
 @python_2_unicode_compatible
 class Company(models.Model):
     name = models.CharField(max_length=255)
@@ -33,6 +41,14 @@ class Company(models.Model):
 
     active = models.BooleanField(default=True)
 
+    # Denormalized sum and count of order ratings.
+    # Kept up to date by Order.save (see also the rebuildratings command)
+    rating_sum = models.PositiveIntegerField(default=0, editable=False)
+    rating_count = models.PositiveIntegerField(default=0, editable=False)
+
+    # Full text search vector (see organisation.search)
+    search_vector = SearchVectorField(null=True, editable=False)
+
     class Meta:
         verbose_name = 'Company'
         verbose_name_plural = 'Companies'
@@ -40,6 +56,17 @@ class Company(models.Model):
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        super(Company, self).save(*args, **kwargs)
+        self.update_search_vector()
+
+    def update_search_vector(self):
+        """Update the search vector. This must be called whenever the
+        company's descriptions or addresses change.
+        """
+        from organisation.search import update_search_vectors
+        update_search_vectors([self.pk])
+
     @property
     def shortdescription(self):
         return {d.lang: d.shorttext for d in self.get_descriptions() if d.text}
@@ -57,27 +84,28 @@ class Company(models.Model):
             self._description_set = list(self.companydescription_set.all())
         return self._description_set
 
+    def get_pictures(self):
+        if not hasattr(self, '_picture_set'):
+            self._picture_set = list(self.picture_set.all().select_related('image').prefetch_related('image__derivatives'))
+        return self._picture_set
+
     @property
     def profile_picture(self):
         """Return the first picture or None if this company has
         no pictures.
-        TODO: optimize
         """
         try:
-            return self.picture_set.all().select_related('image')[0]
+            return self.get_pictures()[0]
         except IndexError:
             return None
 
     @property
     def rating(self):
-        ratings = self.get_ratings()
-        rating_count = len(ratings)
-
         # Rating count has to be greater than or equal to 2 before
         # ratings can be visible.
-        if rating_count >= 2:
-            return float(sum(map(lambda x: x['rating'], ratings))) / float(rating_count)
-            
+        if self.rating_count >= 2:
+            return float(self.rating_sum) / float(self.rating_count)
+
         return None
 
     def has_ytr(self):
@@ -94,6 +122,51 @@ class Company(models.Model):
             self._rating_set = list(self.order_set.filter(rating__isnull=False).values('id', 'rating', 'rated', 'user', 'company'))
         return self._rating_set
 
+    @staticmethod
+    def update_rating_aggregate(company_id, old_rating, new_rating):
+        """Update the denormalized rating sum and count of a company
+        when one of its orders is rated, or the rating is changed or removed.
+        """
+        if old_rating == new_rating:
+            return
+
+        Company.objects.filter(pk=company_id).update(
+            rating_sum=models.F('rating_sum') + (new_rating or 0) - (old_rating or 0),
+            rating_count=models.F('rating_count') + (new_rating is not None) - (old_rating is not None),
+        )
+        bump_company_versions(company_id)
+
+    @classmethod
+    def rebuild_rating_aggregates(cls, companies=None):
+        """Recalculate the denormalized rating sums and counts from orders.
+
+        :param companies: list of company IDs to rebuild (default is all)
+        :return: number of companies updated
+        """
+        from orders.models import Order
+
+        companyset = cls.objects.all()
+        orderset = Order.objects.filter(rating__isnull=False)
+        if companies:
+            companyset = companyset.filter(id__in=companies)
+            orderset = orderset.filter(company_id__in=companies)
+
+        ratings = orderset.values('company').annotate(
+            rating_sum=models.Sum('rating'),
+            rating_count=models.Count('rating'),
+            ).order_by()
+
+        with transaction.atomic():
+            count = companyset.update(rating_sum=0, rating_count=0)
+            for r in ratings:
+                cls.objects.filter(pk=r['company']).update(
+                    rating_sum=r['rating_sum'],
+                    rating_count=r['rating_count']
+                )
+            bump_company_versions(*companyset.values_list('pk', flat=True))
+
+        return count
+
 class CompanyDescription(models.Model):
     """Language variants for company description"""
     company = models.ForeignKey(Company, on_delete=models.CASCADE)
@@ -213,13 +286,28 @@ class YTRCompany(models.Model):
     # code is designated by YTR, do not allow to change it
     code = models.CharField(editable=False, max_length=20, default='', null=True, blank=True, verbose_name='YTR code')
 
+    # Incremental synchronization (see the ytrsync command.)
+    # content_hash is the hash of the imported YTR data (see ytr.parser.content_hash)
+    # and exported_hash the hash of our data (see export_hash) when it was
+    # last imported from or exported to YTR.
+    content_hash = models.CharField(editable=False, max_length=64, blank=True)
+    exported_hash = models.CharField(editable=False, max_length=64, blank=True)
+    last_seen = models.DateTimeField(editable=False, null=True, blank=True,
+                                     help_text='When the company was last seen in YTR')
+
     def __str__(self):
         return self.code if self.code else _('(No YTR code)')
 
     @classmethod
-    def map(cls, company):
+    def export_hash(cls, company, code=None):
+        """Hash of the data exported to YTR for the company."""
+        return hashlib.sha256(json.dumps(cls.map(company, code), sort_keys=True).encode('utf-8')).hexdigest()
+
+    @classmethod
+    def map(cls, company, code=None):
         # map our data to match YTR fields
-        code = "" if not company.has_ytr() else company.ytr.code
+        if code is None:
+            code = "" if not company.has_ytr() else company.ytr.code
         data = {
             "entities": [
                 {
@@ -251,3 +339,56 @@ class YTRCompany(models.Model):
         }
         return data
 
+
+# Content versions of the public company listings (see palvelutori.conditional)
+
+def company_version_key(company_id):
+    return 'company:%s' % company_id
+
+def bump_company_versions(*company_ids):
+    """Mark the listing and the given companies as changed. This also
+    makes their cached representations stale (see organisation.cache.)
+
+    The listing version is shared by every company, so it is bumped
+    after the transaction commits: writers to different companies do
+    not wait for each other's transactions to end.
+    """
+    if company_ids:
+        ContentVersion.bump(*[company_version_key(pk) for pk in company_ids])
+        transaction.on_commit(lambda: ContentVersion.bump('companies'))
+
+@receiver([post_save, post_delete], sender=Company)
+def _bump_company(sender, instance, **kwargs):
+    bump_company_versions(instance.pk)
+
+@receiver([post_save, post_delete], sender=CompanyDescription)
+@receiver([post_save, post_delete], sender=CompanyLink)
+@receiver([post_save, post_delete], sender=Address)
+@receiver([post_save, post_delete], sender=CompanyRating)
+@receiver([post_save, post_delete], sender=Picture)
+def _bump_company_content(sender, instance, **kwargs):
+    bump_company_versions(instance.company_id)
+
+@receiver(m2m_changed, sender=Company.offered_services.through)
+def _bump_offered_services(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if not reverse:
+        bump_company_versions(instance.pk)
+    elif pk_set is not None:
+        bump_company_versions(*pk_set)
+    else:
+        bump_company_versions(*instance.company_set.values_list('pk', flat=True))
+
+@receiver(pre_delete, sender='services.ServicePackage')
+def _bump_service_companies(sender, instance, **kwargs):
+    # The offered services of companies are removed without m2m_changed
+    bump_company_versions(*instance.company_set.values_list('pk', flat=True))
+
+@receiver([post_save, post_delete], sender='media.Image')
+def _bump_image_companies(sender, instance, **kwargs):
+    bump_company_versions(*Picture.objects.filter(image_id=instance.pk).values_list('company_id', flat=True))
+
+@receiver([post_save, post_delete], sender='media.ImageDerivative')
+def _bump_derivative_companies(sender, instance, **kwargs):
+    bump_company_versions(*Picture.objects.filter(image_id=instance.original_id).values_list('company_id', flat=True))
@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+# coding=utf-8
+
+"""
+Full text search for companies.
+
+Each company has a precomputed search vector (Company.search_vector)
+built from its name, email, language variants of its descriptions
+and its addresses. The vector is indexed with a GIN index, so
+searching does not need to join the description and address tables.
+"""
+
+from __future__ import unicode_literals
+
+from django.contrib.postgres.search import SearchQueryField
+from django.db import connection
+from django.db.models import Value
+
+import re
+
+# Description language -> PostgreSQL text search configuration.
+# Descriptions in other languages are indexed with the 'simple' configuration.
+SEARCH_CONFIGS = (
+    ('fi', 'finnish'),
+    ('sv', 'swedish'),
+    ('en', 'english'),
+)
+
+_DESCRIPTION_SQL = """
+    || setweight(to_tsvector('{config}', coalesce((
+        SELECT string_agg(d.shorttext || ' ' || d.text, ' ')
+        FROM organisation_companydescription d
+        WHERE d.company_id = c.id AND {condition}
+        ), '')), 'B')"""
+
+_UPDATE_SQL = """
+UPDATE organisation_company c SET search_vector =
+    setweight(to_tsvector('simple', c.name || ' ' || c.email), 'A')
+    {descriptions}
+    || setweight(to_tsvector('simple', coalesce((
+        SELECT string_agg(concat_ws(' ', a."streetAddress", a."streetAddress2", a."streetAddress3", a.postalcode, a.city), ' ')
+        FROM organisation_address a
+        WHERE a.company_id = c.id
+        ), '')), 'C')
+""".format(descriptions=''.join(
+    [_DESCRIPTION_SQL.format(config=config, condition="d.lang = '%s'" % lang) for lang, config in SEARCH_CONFIGS] +
+    [_DESCRIPTION_SQL.format(config='simple', condition="d.lang NOT IN (%s)" % ', '.join("'%s'" % lang for lang, _ in SEARCH_CONFIGS))]
+    ))
+
+# Characters with a special meaning in to_tsquery input
+_TSQUERY_SPECIAL = re.compile(r"[&|!():*<>'\\]+")
+
+
+def update_search_vectors(companies=None, cursor=None):
+    """Recalculate the search vectors of the given companies.
+
+    :param companies: list of company IDs to update (default is all)
+    :param cursor: database cursor to use (default is a new cursor)
+    """
+    if companies is not None and not companies:
+        return
+
+    sql = _UPDATE_SQL
+    params = []
+    if companies is not None:
+        sql += " WHERE c.id = ANY(%s)"
+        params.append(list(companies))
+
+    if cursor is None:
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+    else:
+        cursor.execute(sql, params)
+
+
+def prefix_query(text):
+    """Convert free text user input into to_tsquery syntax, where
+    every word must match (as a prefix, so results can be shown while
+    the user is still typing.)
+
+    Returns an empty string if the text contains no searchable words.
+    """
+    words = [w for w in _TSQUERY_SPECIAL.sub(' ', text).split() if w]
+    return ' & '.join(w + ':*' for w in words)
+
+
+class CompanySearchQuery(Value):
+    """A text search query matched against Company.search_vector.
+
+    The query is parsed with every configuration in SEARCH_CONFIGS (and
+    the 'simple' configuration for names and addresses) and the results
+    are combined, so a search matches descriptions in any language.
+    """
+    _output_field = SearchQueryField()
+
+    def __init__(self, text):
+        super(CompanySearchQuery, self).__init__(prefix_query(text))
+
+    def as_sql(self, compiler, connection):
+        configs = [config for _, config in SEARCH_CONFIGS] + ['simple']
+        sql = ' || '.join("to_tsquery('%s', %%s)" % config for config in configs)
+        return '(' + sql + ')', [self.value] * len(configs)
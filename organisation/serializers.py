@@ -1,7 +1,10 @@
 from django.contrib.auth import authenticate
 from django.db import transaction
+from django.db.models import Prefetch, prefetch_related_objects
 from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
 
+from organisation import cache as representation_cache
 from organisation.models import Company, CompanyDescription, Address, CompanyLink, Picture, CompanyRating
 from media.models import Image, ImageError
 
@@ -45,11 +48,23 @@ class AnonymousCompanyRatingSerializer(serializers.ModelSerializer):
 class PictureSerializer(serializers.ModelSerializer):
     class Meta:
         model = Picture
-        fields = ('id', 'url', 'width', 'height', 'title', 'num')
+        fields = ('id', 'url', 'width', 'height', 'sizes', 'status', 'title', 'num')
 
     url = serializers.URLField(source='image.image.url', read_only=True)
     width = serializers.IntegerField(source='image.width', read_only=True)
     height = serializers.IntegerField(source='image.height', read_only=True)
+    status = serializers.CharField(source='image.status', read_only=True,
+                                   help_text='"pending" until the uploaded image has been processed')
+    sizes = serializers.SerializerMethodField(help_text='Image URL and size by name (thumbnail, card and full)')
+
+    def get_sizes(self, obj):
+        return {
+            name: {
+                'url': img.image.url,
+                'width': img.width,
+                'height': img.height,
+            } for name, img in obj.image.get_sizes().items()
+        }
 
 
 class PictureUploadSerializer(serializers.Serializer):
@@ -60,7 +75,7 @@ class PictureUploadSerializer(serializers.Serializer):
     def validate_image(self, value):
         imgdata = BytesIO(base64.b64decode(value))
         try:
-            img = Image.save_or_get(imgdata)
+            img = Image.save_or_queue(imgdata)
         except ImageError as ex:
             raise serializers.ValidationError(ex.message)
         return img
@@ -72,11 +87,40 @@ class PictureUploadSerializer(serializers.Serializer):
         )
 
 
+class PictureFileUploadSerializer(serializers.Serializer):
+    """Picture upload as a file (multipart form or raw request body)"""
+    file = serializers.FileField()
+    title = serializers.CharField(required=False, default='')
+    num = serializers.IntegerField(required=False, default=0)
+
+    def validate_file(self, value):
+        try:
+            return Image.save_or_queue(value)
+        except (ImageError, IOError) as ex:
+            raise serializers.ValidationError(str(ex))
+
+    def create(self, validated_data):
+        return Picture.objects.create(
+            company_id=self.context['view'].kwargs['company_pk'],
+            image=validated_data['file'],
+            title=validated_data['title'],
+            num=validated_data['num'],
+        )
+
+
+class CompanyListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        return self.child.get_representations(list(data.all() if hasattr(data, 'all') else data))
+
+
 class CompanySerializer(serializers.ModelSerializer):
     """
+    Companies are serialized through the representation cache
+    (see organisation.cache) when read with a safe request method.
     """
     class Meta:
         model = Company
+        list_serializer_class = CompanyListSerializer
         read_only_fields = (
             'businessid',
             'ratings',
@@ -108,6 +152,39 @@ class CompanySerializer(serializers.ModelSerializer):
 
     rating = serializers.FloatField(read_only=True)
 
+    @staticmethod
+    def prefetch(companies):
+        """Prefetch everything the representation needs, so serializing
+        any number of companies takes a fixed number of queries.
+        """
+        prefetch_related_objects(
+            companies,
+            'companydescription_set',
+            'addresses',
+            'links',
+            'ratings',
+            'offered_services',
+            Prefetch(
+                'picture_set',
+                queryset=Picture.objects.select_related('image').prefetch_related('image__derivatives'),
+                to_attr='_picture_set'
+            ),
+        )
+
+    def to_representation(self, instance):
+        return self.get_representations([instance])[0]
+
+    def get_representations(self, companies):
+        def serialize(companies):
+            self.prefetch(companies)
+            return [super(CompanySerializer, self).to_representation(c) for c in companies]
+
+        request = self.context.get('request')
+        if request is None or request.method not in SAFE_METHODS:
+            return serialize(companies)
+
+        return representation_cache.get_representations(companies, request.build_absolute_uri('/'), serialize)
+
     def update(self, instance, validated_data):
         addresses = validated_data.pop('addresses', None)
         description = validated_data.pop('description', {})
@@ -146,4 +223,6 @@ class CompanySerializer(serializers.ModelSerializer):
                     ) for link in links if link['url']
                 ])
 
+            instance.update_search_vector()
+
             return instance
@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+# coding=utf-8
+
+from __future__ import print_function, unicode_literals
+
+from unittest import skipUnless
+from django.conf import settings
+from django.db import connection
+from django.test import TestCase
+
+from .models import Company
+
+import random
+import time
+
+COMPANY_COUNT = 30000
+POSTALCODE_COUNT = 10000
+ROUNDS = 100
+
+@skipUnless(settings.TEST_BENCHMARKS, "Benchmarks disabled")
+class ServiceAreaBenchmark(TestCase):
+    """Look up companies serving a postal code among tens of thousands of companies."""
+
+    @classmethod
+    def setUpTestData(cls):
+        rnd = random.Random(0)
+        codes = ['%05d' % i for i in range(POSTALCODE_COUNT)]
+
+        Company.objects.bulk_create([
+            Company(
+                name='Company %d' % i,
+                businessid='%07d-0' % i,
+                service_areas=rnd.sample(codes, 3),
+                active=rnd.random() > 0.1,
+            ) for i in range(COMPANY_COUNT)
+        ], batch_size=1000)
+
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE organisation_company')
+
+    def test_postalcode_lookup(self):
+        rnd = random.Random(1)
+
+        def lookup(codes):
+            return list(Company.objects.filter(active=True, service_areas__overlap=codes).values_list('id', flat=True))
+
+        # The GIN index should be used
+        q = Company.objects.filter(active=True, service_areas__overlap=['00123'])
+        sql, params = q.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN ' + sql, params)
+            plan = '\n'.join(row[0] for row in cursor.fetchall())
+        self.assertIn('organisation_company_service_areas_gin', plan)
+
+        timings = []
+        for _ in range(ROUNDS):
+            codes = ['%05d' % rnd.randrange(POSTALCODE_COUNT) for _ in range(rnd.randint(1, 3))]
+            start = time.perf_counter()
+            lookup(codes)
+            timings.append(time.perf_counter() - start)
+
+        timings.sort()
+        print("\nPostal code lookup among {} companies: median {:.3f} ms, 95th percentile {:.3f} ms".format(
+            COMPANY_COUNT,
+            timings[len(timings) // 2] * 1000,
+            timings[int(len(timings) * 0.95)] * 1000,
+            ))
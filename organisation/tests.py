@@ -3,15 +3,24 @@
 
 from __future__ import unicode_literals
 
+from django.conf import settings
+from django.core.cache import caches
 from django.core.urlresolvers import reverse
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
 from rest_framework import status
 from rest_framework.test import APITestCase
 
 from palvelutori import test_mixins
-from .models import Company
+from palvelutori.models import User
+from media.models import Image
+from orders.models import Order
+from .models import Company, CompanyDescription, CompanyLink, CompanyRating, Address, Picture
 
 from copy import deepcopy
 from ytr import client
+import os
 
 class CompanyTest(test_mixins.BasicUpdateApiTestCaseRunMixin,
                   test_mixins.BasicCRUDApiTestCaseSetupMixin,
@@ -97,6 +106,38 @@ class CompanyTest(test_mixins.BasicUpdateApiTestCaseRunMixin,
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(len(response.data['results']), 0)
 
+    def test_picture_upload(self):
+        template_user = self.template_users['normal_user1']
+        User.objects.filter(email=template_user['email']).update(company=self.objects[0])
+        self.client.login(email=template_user['email'], password=template_user['password'])
+
+        url = reverse('api:company-pictures-upload', kwargs={'company_pk': self.objects[0].id})
+        path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'media', 'test_images', 'test1.png')
+
+        with open(path, 'rb') as f:
+            response = self.client.post(url, {'file': f, 'title': 'Multipart'}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['title'], 'Multipart')
+        self.assertEqual((response.data['width'], response.data['height']), (32, 48))
+
+        # The same file uploaded as the request body is deduplicated
+        with open(path, 'rb') as f:
+            response = self.client.post(url + '?title=Raw', f.read(), content_type='image/png')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['title'], 'Raw')
+        self.assertEqual(Image.objects.count(), 1)
+        self.assertEqual(Picture.objects.filter(company=self.objects[0]).count(), 2)
+
+        # Not an image
+        response = self.client.post(url, b'not an image', content_type='image/png')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        # Other companies' pictures cannot be uploaded
+        url = reverse('api:company-pictures-upload', kwargs={'company_pk': self.objects[1].id})
+        with open(path, 'rb') as f:
+            response = self.client.post(url, f.read(), content_type='image/png')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
     def test_hiding(self):
         self.objects[0].active = False
         self.objects[0].save()
@@ -136,3 +177,196 @@ class CompanyTest(test_mixins.BasicUpdateApiTestCaseRunMixin,
 
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(len(response.data['results']), len(self.objects)-1)
+
+    def test_postalcode_filter(self):
+        self.objects[0].service_areas = ['20500']
+        self.objects[0].save()
+
+        url = reverse('api:company-list')
+
+        response = self.client.get(url, data={'postalcode': '20500'})
+        self.assertEqual([c['id'] for c in response.data['results']], [self.objects[0].id])
+
+        response = self.client.get(url, data={'postalcode': '20100'})
+        self.assertEqual(len(response.data['results']), len(self.objects)-1)
+
+        response = self.client.get(url, data={'postalcode': '20100,20500'})
+        self.assertEqual(len(response.data['results']), len(self.objects))
+
+        response = self.client.get(url, data={'postalcode': '99999'})
+        self.assertEqual(len(response.data['results']), 0)
+
+    def test_search_descriptions_and_addresses(self):
+        user = self.template_users['staff_user']
+        self.client.login(email=user['email'], password=user['password'])
+
+        obj = self.objects[1]
+        payload = self.get_object_template(self.template_object, 1)
+        payload.update(self.update_object)
+        response = self.client.put(reverse(self.update_url, args=(obj.id,)), data=payload)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        url = reverse('api:company-list')
+
+        # English description (stemmed)
+        response = self.client.get(url, data={'search': 'descriptions'})
+        self.assertEqual([c['id'] for c in response.data['results']], [obj.id])
+
+        # Street address prefix
+        response = self.client.get(url, data={'search': 'Testikat'})
+        self.assertEqual([c['id'] for c in response.data['results']], [obj.id])
+
+        # Every company matches by name
+        response = self.client.get(url, data={'search': 'Test'})
+        self.assertEqual(len(response.data['results']), len(self.objects))
+
+        # Nothing searchable
+        response = self.client.get(url, data={'search': '&!'})
+        self.assertEqual(len(response.data['results']), 0)
+
+
+    def test_conditional_get(self):
+        obj = self.objects[0]
+        urls = (
+            reverse('api:company-list'),
+            reverse(self.detail_url, args=(obj.id,)),
+            reverse('api:company-pictures-list', kwargs={'company_pk': obj.id}),
+        )
+
+        for url, query_count in zip(urls, (1, 2, 1)):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            etag = response['ETag']
+
+            # Unchanged content is validated without serializing it
+            # (details also check that the object exists)
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+            self.assertEqual(response['ETag'], etag)
+            self.assertEqual(len(queries), query_count)
+
+            # Changing the company changes the ETag
+            CompanyDescription.objects.update_or_create(company=obj, lang='fi', defaults={'text': url})
+            test_mixins.run_commit_hooks()
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertNotEqual(response['ETag'], etag)
+
+        # Other companies are not affected
+        url = reverse(self.detail_url, args=(self.objects[1].id,))
+        etag = self.client.get(url)['ETag']
+        CompanyLink.objects.create(company=obj, linktype='web', url='http://example.com/')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        # Companies that can no longer be shown are not validated,
+        # even if their version has not changed (no signals are sent here)
+        Company.objects.filter(pk=self.objects[1].id).update(active=False)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_representation_cache(self):
+        obj = self.objects[0]
+        list_url = reverse('api:company-list')
+        detail_url = reverse(self.detail_url, args=(obj.id,))
+        companies = dict(settings.CACHES['companies'], LOCATION='test-companies', TIMEOUT=300)
+
+        with self.settings(CACHES=dict(settings.CACHES, companies=companies)):
+            caches['companies'].clear()
+
+            with CaptureQueriesContext(connection) as uncached:
+                expected = self.client.get(list_url).data
+
+            # Cached companies are not serialized again
+            with CaptureQueriesContext(connection) as cached:
+                response = self.client.get(list_url)
+            self.assertEqual(response.data, expected)
+            self.assertLess(len(cached), len(uncached))
+
+            # Changes to a company are visible immediately
+            CompanyDescription.objects.create(company=obj, lang='fi', text='Uusi kuvaus')
+            response = self.client.get(detail_url)
+            self.assertEqual(response.data['description'], {'fi': 'Uusi kuvaus'})
+
+            CompanyRating.objects.create(company=obj, rating=4, message='Hyvä')
+            response = self.client.get(detail_url)
+            self.assertEqual(len(response.data['ratings']), 1)
+
+
+class CompanyListQueryCountTest(APITestCase):
+    """Listing companies should take a constant number of queries,
+    no matter how many companies are on the page."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+
+        Company.objects.bulk_create([
+            Company(
+                name='Company %d' % i,
+                businessid='1000000-%d' % i,
+                service_areas=['20100'],
+            ) for i in range(1000)
+        ])
+        companies = list(Company.objects.all())
+
+        CompanyDescription.objects.bulk_create([
+            CompanyDescription(company=c, lang=lang, shorttext='Short', text='Long')
+            for c in companies for lang in ('fi', 'en')
+        ])
+        CompanyLink.objects.bulk_create([
+            CompanyLink(company=c, linktype='web', url='http://example.com/')
+            for c in companies
+        ])
+        Address.objects.bulk_create([
+            Address(company=c, name='test', addressType=Address.TYPE_SNAILMAIL,
+                    streetAddress='Testikatu 1', postalcode='20100', city='Turku', country='FI')
+            for c in companies
+        ])
+
+        image = Image.objects.create(sha256='0' * 64, image='images/test.png', width=32, height=32)
+        Picture.objects.bulk_create([Picture(company=c, image=image) for c in companies])
+
+        now = timezone.now()
+        Order.objects.bulk_create([
+            Order(
+                company=c,
+                user_first_name='Test',
+                user_last_name='User',
+                user_email='test@example.com',
+                user_phone='+12345678',
+                site_address_street='Testikatu 1',
+                site_address_postalcode='20100',
+                site_address_city='Turku',
+                service_package_shortname='palvelu-paketti',
+                duration=1,
+                price=10,
+                timeslot_start=now,
+                timeslot_end=now,
+                rating=rating,
+            ) for c in companies for rating in (3, 5)
+        ])
+        Company.rebuild_rating_aggregates()
+
+    def count_list_queries(self, limit):
+        url = reverse('api:company-list')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, data={'limit': limit})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), limit)
+        for company in response.data['results']:
+            self.assertEqual(company['rating'], 4.0)
+            self.assertIsNotNone(company['profile_picture'])
+            self.assertEqual(len(company['addresses']), 1)
+            self.assertEqual(len(company['links']), 1)
+            self.assertEqual(company['description'], {'fi': 'Long', 'en': 'Long'})
+
+        return len(queries)
+
+    def test_list_query_count(self):
+        counts = [self.count_list_queries(limit) for limit in (10, 100, 1000)]
+
+        self.assertEqual(counts[0], counts[1])
+        self.assertEqual(counts[0], counts[2])
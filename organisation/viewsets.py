@@ -5,47 +5,73 @@ from __future__ import unicode_literals
 
 from django.contrib.auth import get_user_model
 from django.http import Http404
-from django.db.models import Q
+from django.contrib.postgres.search import SearchRank
+from django.db.models import F
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
 
-from rest_framework import viewsets, mixins
+from rest_framework import viewsets, mixins, status
+from rest_framework.parsers import MultiPartParser
 from rest_framework.permissions import AllowAny, IsAdminUser, SAFE_METHODS
 from rest_framework.exceptions import PermissionDenied, NotAuthenticated
 from rest_framework.decorators import detail_route, list_route
 from rest_framework.response import Response
 
-from organisation.models import Company, Address, CompanyRating, Picture
-from organisation.serializers import CompanySerializer, CompanyRatingSerializer, PictureSerializer, PictureUploadSerializer
+from organisation.models import Company, Address, CompanyRating, Picture, company_version_key
+from organisation.search import CompanySearchQuery
+from organisation.serializers import CompanySerializer, CompanyRatingSerializer, PictureSerializer, PictureUploadSerializer, PictureFileUploadSerializer
+from media.parsers import RawImageParser
 from api.user_serializers import PublicUserSerializer
+from palvelutori.conditional import ConditionalGetMixin
 from palvelutori.models import User
 
-class CompanyViewSet(mixins.RetrieveModelMixin,
+class CompanyViewSet(ConditionalGetMixin,
+                     mixins.RetrieveModelMixin,
                      mixins.ListModelMixin,
                      mixins.UpdateModelMixin,
                      viewsets.GenericViewSet):
     """
     Company listings.
 
+    Query parameters:
+    search -- full text search
+    postalcode -- only companies serving the given postal code(s).
+                  Multiple codes can be separated by commas.
+
+    Responses have an ETag and can be fetched conditionally.
     """
     serializer_class = CompanySerializer
 
     def get_queryset(self):
         q = Company.objects.filter(active=True)
 
+        postalcodes = [
+            code.strip()
+            for param in self.request.query_params.getlist('postalcode')
+            for code in param.split(',') if code.strip()
+        ]
+
+        if postalcodes:
+            # Companies serving any of the given postal codes
+            q = q.filter(service_areas__overlap=postalcodes)
+
         search = self.request.query_params.get('search', '')
 
         if search:
-            # TODO use the new fulltext search functionality in
-            # Django 1.10
-            q = q.filter(
-                Q(email=search) |
-                Q(name__icontains=search) |
-                Q(companydescription__text__icontains=search) |
-                Q(addresses__streetAddress__icontains=search) |
-                Q(addresses__postalcode=search)
-                ).distinct()
+            query = CompanySearchQuery(search)
+            if not query.value:
+                return q.none()
+
+            q = q.filter(search_vector=query).annotate(
+                search_rank=SearchRank(F('search_vector'), query)
+                ).order_by('-search_rank', 'id')
 
         return q
 
+    def get_content_versions(self):
+        if self.action == 'list':
+            return ['companies']
+        return [company_version_key(self.kwargs['pk'])]
+
     def get_object(self):
         obj = super(CompanyViewSet, self).get_object()
 
@@ -89,18 +115,44 @@ class CompanyRatingViewSet(viewsets.ModelViewSet):
 
         return super(CompanyRatingViewSet, self).perform_create(serializer)
 
-class CompanyPictureViewSet(viewsets.ModelViewSet):
+class CompanyPictureViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
+    """Company pictures.
+
+    New pictures can be created by posting a base64 encoded image, or
+    more efficiently with the upload command, which accepts the image
+    file as a multipart form ("file" field) or as the request body
+    (with an image/* content type.)
+
+    Uploaded images may be processed in the background, in which case
+    the picture's status is "pending" until it has been processed.
+
+    Responses have an ETag and can be fetched conditionally.
+    """
     serializer_class = PictureSerializer
     create_serializer_class = PictureUploadSerializer
-    
+    upload_serializer_class = PictureFileUploadSerializer
+
     def get_serializer_class(self):
         if self.action == 'create':
             return self.create_serializer_class
+        if self.action == 'upload':
+            return self.upload_serializer_class
         return self.serializer_class
 
+    def initialize_request(self, request, *args, **kwargs):
+        request = super(CompanyPictureViewSet, self).initialize_request(request, *args, **kwargs)
+        if self.action == 'upload':
+            # Stream uploads straight to a temporary file
+            request.upload_handlers = [TemporaryFileUploadHandler(request)]
+        return request
+
     def get_queryset(self):
-        return Picture.objects.filter(company_id=self.kwargs['company_pk'], company__active=True)
-    
+        return Picture.objects.filter(company_id=self.kwargs['company_pk'], company__active=True) \
+            .select_related('image').prefetch_related('image__derivatives')
+
+    def get_content_versions(self):
+        return [company_version_key(self.kwargs['company_pk'])]
+
     def get_object(self):
         obj = super(CompanyPictureViewSet, self).get_object()
         
@@ -122,6 +174,35 @@ class CompanyPictureViewSet(viewsets.ModelViewSet):
 
         return super(CompanyPictureViewSet, self).create(request, company_pk=company_pk)
 
+    @list_route(methods=['post'], parser_classes=[MultiPartParser, RawImageParser])
+    def upload(self, request, company_pk=None):
+        """Upload a picture file.
+        ---
+        serializer: organisation.serializers.PictureFileUploadSerializer
+        response_serializer: organisation.serializers.PictureSerializer
+        """
+        if self.request.user.company_id != int(company_pk):
+            self.permission_denied(
+                self.request,
+                message='Not a member of this company'
+            )
+
+        data = request.data
+        if request.content_type.startswith('image/'):
+            # Raw image upload: other fields are given as query parameters
+            data = {
+                'file': request.data['file'],
+                'title': request.query_params.get('title', ''),
+                'num': request.query_params.get('num', 0),
+            }
+
+        serializer = self.get_serializer(data=data)
+        serializer.is_valid(raise_exception=True)
+        picture = serializer.save()
+
+        return Response(PictureSerializer(picture, context=self.get_serializer_context()).data,
+                        status=status.HTTP_201_CREATED)
+
 
 class CompanyUserViewSet(mixins.RetrieveModelMixin,
                      mixins.ListModelMixin,
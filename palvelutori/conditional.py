@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+# coding=utf-8
+
+"""
+Conditional GET support for read-mostly API endpoints.
+
+A view declares which content versions (see ContentVersion) its
+responses depend on. The ETag of a response is derived from those
+versions and the request, so a conditional request can be answered
+with 304 Not Modified after a single query, without fetching or
+serializing anything.
+
+The versions are read before the response is built. If the content
+changes in between, or a version is bumped only after the change has
+been committed, the response is newer than its ETag, which only causes
+the client to download it again later.
+"""
+
+from __future__ import unicode_literals
+
+from django.conf import settings
+from django.http import HttpResponseNotModified
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+
+from palvelutori.models import ContentVersion
+
+import calendar
+import hashlib
+
+
+class ConditionalGetMixin(object):
+    """Adds ETag, Last-Modified and Cache-Control headers to list and
+    retrieve responses, and answers conditional requests for unchanged
+    content with 304 Not Modified.
+
+    Views must implement get_content_versions().
+    """
+    cache_max_age = None
+
+    def get_content_versions(self):
+        """Return the ContentVersion keys the response depends on."""
+        raise NotImplementedError('get_content_versions() must be implemented')
+
+    def get_etag(self, request, versions):
+        user = request.user.pk if request.user.is_authenticated() else ''
+        parts = [request.get_full_path(), request.META.get('HTTP_ACCEPT', ''),
+                 getattr(request, 'LANGUAGE_CODE', ''), user]
+        parts.extend(versions)
+        return hashlib.sha1('|'.join('%s' % p for p in parts).encode('utf-8')).hexdigest()
+
+    def conditional_response(self, handler, request, *args, **kwargs):
+        versions, modified = ContentVersion.get(*self.get_content_versions())
+        etag = self.get_etag(request, versions)
+        last_modified = calendar.timegm(modified.utctimetuple()) if modified else None
+
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = handler(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+        elif not isinstance(response, HttpResponseNotModified):
+            return response
+        elif self.action == 'retrieve':
+            # The versions of an object that does not exist can match too
+            self.get_object()
+
+        response['ETag'] = quote_etag(etag)
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified)
+
+        max_age = self.cache_max_age
+        if max_age is None:
+            max_age = settings.API_CACHE_MAX_AGE
+        if request.user.is_authenticated():
+            patch_cache_control(response, private=True, max_age=max_age, must_revalidate=True)
+        else:
+            patch_cache_control(response, public=True, max_age=max_age, must_revalidate=True)
+        patch_vary_headers(response, ('Accept', 'Accept-Language', 'Authorization', 'Cookie'))
+
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(super(ConditionalGetMixin, self).list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_response(super(ConditionalGetMixin, self).retrieve, request, *args, **kwargs)
@@ -7,7 +7,7 @@ from django.contrib.auth.base_user import AbstractBaseUser, BaseUserManager
 from django.contrib.auth.models import PermissionsMixin
 from django.core.urlresolvers import reverse
 from django.core.mail import send_mail
-from django.db import models, transaction
+from django.db import connection, models, transaction
 from django.utils import timezone
 
 import random, string
@@ -171,3 +171,54 @@ class UserSite(models.Model):
     sanitary_count = models.PositiveSmallIntegerField(blank=True, null=True)
     floor_count = models.PositiveSmallIntegerField(blank=True, null=True)
     floor_area = models.DecimalField(max_digits=8, decimal_places=2, blank=True, null=True)
+
+
+class ContentVersion(models.Model):
+    """A version counter of a set of public content.
+
+    The version is incremented whenever the content changes, so
+    responses built from the content can be validated without building
+    them again (see palvelutori.conditional.)
+    """
+    key = models.CharField(max_length=64, primary_key=True)
+    version = models.BigIntegerField(default=0)
+    modified = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return '%s:%d' % (self.key, self.version)
+
+    @classmethod
+    def bump(cls, *keys):
+        """Increment the versions of the given keys.
+
+        The keys are updated in a fixed order, so concurrent
+        transactions bumping the same keys cannot deadlock.
+        """
+        if not keys:
+            return
+
+        with connection.cursor() as cursor:
+            cursor.execute("""
+                INSERT INTO {table} AS v (key, version, modified)
+                SELECT k, 1, clock_timestamp() FROM unnest(%s::varchar[]) AS k
+                ON CONFLICT (key) DO UPDATE SET version = v.version + 1, modified = excluded.modified
+                """.format(table=cls._meta.db_table), [sorted(set(keys))])
+
+    @classmethod
+    def get(cls, *keys):
+        """Get the current versions of the given keys.
+
+        Returns a (versions, modified) pair, where versions is a tuple
+        of version numbers in the order of the keys, and modified is the
+        last modification time, or None if any of the keys has never
+        been modified.
+        """
+        rows = dict(
+            (key, (version, modified))
+            for key, version, modified in cls.objects.filter(key__in=keys).values_list('key', 'version', 'modified')
+        )
+        versions = tuple(rows.get(key, (0, None))[0] for key in keys)
+        modified = None
+        if len(rows) == len(set(keys)):
+            modified = max(m for v, m in rows.values())
+        return versions, modified
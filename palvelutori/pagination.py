@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+# coding=utf-8
+
+from __future__ import unicode_literals
+
+from rest_framework.pagination import CursorPagination, LimitOffsetPagination
+
+
+class KeysetPagination(CursorPagination):
+    """Cursor pagination over the view's ordering.
+
+    The primary key is appended to the ordering as a tie-breaker, so
+    entries with the same ordering value are always returned in the
+    same order.
+
+    The cursor position is the value of the first ordering field only.
+    Entries with the same value as the position are skipped with an
+    offset, so a page starting within a long run of equal values costs
+    as much as an offset page.
+    """
+    page_size_query_param = 'limit'
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+
+        if page_size <= 0:
+            return self.page_size
+        return page_size
+
+    def get_ordering(self, request, queryset, view):
+        self.ordering = getattr(view, 'ordering', None) or queryset.model._meta.ordering or ('pk',)
+        ordering = list(super(KeysetPagination, self).get_ordering(request, queryset, view))
+
+        if not any(o.lstrip('-') in ('pk', 'id') for o in ordering):
+            ordering.append('-pk' if ordering[0].startswith('-') else 'pk')
+
+        return tuple(ordering)
+
+
+class OptionalCursorPagination(LimitOffsetPagination):
+    """Limit/offset pagination, with optional cursor pagination.
+
+    Cursor pagination is used when the request has the "cursor" query
+    parameter, or "pagination=cursor" for the first page. Cursor pages
+    have "next" and "previous" links but no total count. Deep cursor
+    pages are not slower than the first ones, unless many entries share
+    the same ordering value (see KeysetPagination.)
+    """
+    keyset_class = KeysetPagination
+    keyset = None
+    _display_page_controls = False
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.keyset_class.cursor_query_param in request.query_params or \
+                request.query_params.get('pagination') == 'cursor':
+            self.keyset = self.keyset_class()
+            return self.keyset.paginate_queryset(queryset, request, view)
+
+        self.keyset = None
+        return super(OptionalCursorPagination, self).paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super(OptionalCursorPagination, self).get_paginated_response(data)
+
+    def to_html(self):
+        if self.keyset is not None:
+            return self.keyset.to_html()
+        return super(OptionalCursorPagination, self).to_html()
+
+    @property
+    def display_page_controls(self):
+        if self.keyset is not None:
+            return self.keyset.display_page_controls
+        return self._display_page_controls
+
+    @display_page_controls.setter
+    def display_page_controls(self, value):
+        self._display_page_controls = value
@@ -9,6 +9,7 @@ https://docs.djangoproject.com/en/1.9/topics/settings/
 For the full list of settings and their values, see
 https://docs.djangoproject.com/en/1.9/ref/settings/
 """
+import datetime
 import os
 
 def str2bool(v):
@@ -36,6 +37,17 @@ DATABASES = {
 MAX_IMAGE_SIZE = (1280, 960)
 ACCEPTED_IMAGE_FORMATS = ('png', 'jpeg', 'jpg', 'gif')
 
+# Only store uploaded images in the request and process them later
+# with the processimages management command, which must be running.
+MEDIA_PROCESS_ASYNC = str2bool(os.environ.get('PALVELUTORI_MEDIA_PROCESS_ASYNC', False))
+
+# Smaller versions of uploaded images: (name, (max width, max height))
+# The original (at most MAX_IMAGE_SIZE) is available as "full".
+IMAGE_DERIVATIVES = (
+    ('thumbnail', (160, 120)),
+    ('card', (480, 360)),
+)
+
 # Email
 
 FEEDBACK_EMAIL = 'test@example.org' # Where to send the feedback form
@@ -106,6 +118,9 @@ TEST_RUNNER = 'palvelutori.testrunner.MediaTestRunner'
 # Test external examples (requires bash)
 TEST_EXAMPLES = True
 
+# Run database benchmarks along with the tests (slow)
+TEST_BENCHMARKS = str2bool(os.environ.get('PALVELUTORI_TEST_BENCHMARKS', False))
+
 # Password validation
 # https://docs.djangoproject.com/en/1.9/ref/settings/#auth-password-validators
 
@@ -127,6 +142,45 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 
+# Authentication tokens expire when they have not been used for this long
+AUTH_TOKEN_EXPIRY = datetime.timedelta(seconds=int(os.environ.get('PALVELUTORI_AUTH_TOKEN_EXPIRY', 14 * 24 * 3600)))
+
+# Token expiry is extended when the token is used, but at most this often
+AUTH_TOKEN_RENEW_INTERVAL = datetime.timedelta(minutes=10)
+
+# Caches
+# The "auth" cache holds API key and authentication token validation results
+# (see api.authcache). It is local to each process: use a shared backend
+# if tokens and keys must be invalidated immediately in every worker.
+# The "companies" cache holds serialized companies (see organisation.cache.)
+# Entries are checked against the company content versions in the database
+# on every read, so a cache local to each process is never stale after a
+# change in another process. A shared backend (for example Redis) only
+# saves memory and serializing the same company in every process.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'auth': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'auth',
+        'TIMEOUT': int(os.environ.get('PALVELUTORI_AUTH_CACHE_TIMEOUT', 60)),
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
+    },
+    'companies': {
+        'BACKEND': os.environ.get('PALVELUTORI_COMPANY_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('PALVELUTORI_COMPANY_CACHE_LOCATION', 'companies'),
+        'TIMEOUT': int(os.environ.get('PALVELUTORI_COMPANY_CACHE_TIMEOUT', 300)),
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
+    },
+}
+
+
 # Django REST Framework
 REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
@@ -144,9 +198,13 @@ REST_FRAMEWORK = {
     'TEST_REQUEST_DEFAULT_FORMAT': 'json'
 }
 
+# Seconds clients and proxies may use cached public catalog responses
+# without revalidating them (see palvelutori.conditional)
+API_CACHE_MAX_AGE = int(os.environ.get('PALVELUTORI_API_CACHE_MAX_AGE', 0))
+
 # Settings for generating a database dump for pilot/dev environment
 PILOT_DUMP = {
-    'exclude': ['sessions.Session', 'api.ApiKey', 'api.AuthToken', 'logger'],
+    'exclude': ['sessions.Session', 'api.ApiKey', 'api.AuthToken', 'logger', 'mailer'],
     }
 
 # Internationalization
@@ -182,6 +240,38 @@ INTERNAL_IPS = os.getenv('PALVELUTORI_INTERNAL_IPS', '::ffff:172.17.0.1').split(
 EMAIL_BACKEND = os.getenv('PALVELUTORI_EMAIL_BACKEND', 'django.core.mail.backends.filebased.EmailBackend')
 EMAIL_FILE_PATH = os.getenv('PALVELUTORI_EMAIL_FILE_PATH', os.path.join(BASE_DIR, 'logs/mail'))
 
+# Put outgoing mail in a queue instead of sending it during the request.
+# The queue is sent by the sendqueuedmail management command, which must be
+# running (or scheduled) when this is enabled.
+MAILER_QUEUE = str2bool(os.environ.get('PALVELUTORI_MAILER_QUEUE', False))
+
+# Maximum number of log entries accepted in one bulk request
+LOGGER_MAX_BATCH_SIZE = 1000
+
+# Buffer bulk log entries in memory and write them in larger batches.
+# Buffered entries are written when there are LOGGER_BUFFER_SIZE of them
+# or LOGGER_BUFFER_INTERVAL seconds after the first one was buffered.
+LOGGER_BUFFER = str2bool(os.environ.get('PALVELUTORI_LOGGER_BUFFER', False))
+LOGGER_BUFFER_SIZE = 500
+LOGGER_BUFFER_INTERVAL = 2.0
+
+# YTR requests time out after (connect, read) seconds. Connection errors and
+# server errors are retried YTR_RETRIES times, waiting
+# YTR_RETRY_BACKOFF * 2^(retry - 1) seconds between retries.
+YTR_TIMEOUT = (5, 30)
+YTR_RETRIES = 3
+YTR_RETRY_BACKOFF = 0.5
+
+# Bulk YTR imports fetch companies with this many concurrent requests
+# and import them in transactions of YTR_IMPORT_BATCH_SIZE companies.
+YTR_IMPORT_WORKERS = int(os.environ.get('PALVELUTORI_YTR_IMPORT_WORKERS', 8))
+YTR_IMPORT_BATCH_SIZE = 100
+
+# Maximum number of business IDs accepted in one bulk import API request.
+# The request is handled synchronously, so this should be small enough to
+# finish well within the proxy timeout. Use the ytrimport command for more.
+YTR_IMPORT_MAX_BULK = 200
+
 # Logging
 
 LOGGING = {
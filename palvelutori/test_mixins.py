@@ -2,11 +2,21 @@
 # coding=utf-8
 
 from django.core.urlresolvers import reverse
+from django.db import connection
 from rest_framework import status
 from .models import User
 
 from collections import OrderedDict
 
+def run_commit_hooks():
+    """Run the functions registered with transaction.on_commit().
+
+    TestCase never commits its transaction, so they are not run otherwise.
+    """
+    hooks, connection.run_on_commit = connection.run_on_commit, []
+    for sids, func in hooks:
+        func()
+
 STR_401_MESSAGE = 'Authentication credentials were not provided.'
 STR_403_MESSAGE = 'You do not have permission to perform this action.'
 
@@ -35,5 +35,25 @@ class TempMediaMixin(object):
         settings.DEFAULT_FILE_STORAGE = self.__original_file_storage
 
 
-class MediaTestRunner(TempMediaMixin, DiscoverRunner):
+class NoCacheMixin(object):
+    """Disable the authentication and company caches.
+
+    Test cases reuse token keys for different users and object IDs, and
+    test transactions are rolled back without invalidating the caches.
+    """
+
+    def setup_test_environment(self):
+        super(NoCacheMixin, self).setup_test_environment()
+
+        self.__original_caches = settings.CACHES
+        settings.CACHES = dict(settings.CACHES)
+        settings.CACHES['auth'] = dict(settings.CACHES['auth'], TIMEOUT=0)
+        settings.CACHES['companies'] = dict(settings.CACHES['companies'], TIMEOUT=0)
+
+    def teardown_test_environment(self):
+        super(NoCacheMixin, self).teardown_test_environment()
+        settings.CACHES = self.__original_caches
+
+
+class MediaTestRunner(NoCacheMixin, TempMediaMixin, DiscoverRunner):
     pass
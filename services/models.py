@@ -1,6 +1,10 @@
 from __future__ import unicode_literals
 
 from django.db import models
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from palvelutori.models import ContentVersion
 
 class ServicePackage(models.Model):
     shortname = models.SlugField(unique=True)
@@ -34,3 +38,11 @@ class ServicePackageDescription(models.Model):
 
     class Meta:
         unique_together = ("package", "lang")
+
+
+# Content version of the service package listing (see palvelutori.conditional)
+
+@receiver([post_save, post_delete], sender=ServicePackage)
+@receiver([post_save, post_delete], sender=ServicePackageDescription)
+def _bump_services(sender, instance, **kwargs):
+    ContentVersion.bump('services')
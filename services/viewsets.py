@@ -8,18 +8,25 @@ from rest_framework.decorators import detail_route, list_route
 from rest_framework.response import Response
 from rest_framework import status
 
+from palvelutori.conditional import ConditionalGetMixin
 from services.models import ServicePackage
 from services.serializers import ServicePackageSerializer
  
-class ServicePackageViewSet(mixins.RetrieveModelMixin,
+class ServicePackageViewSet(ConditionalGetMixin,
+                     mixins.RetrieveModelMixin,
                      mixins.ListModelMixin,
                      viewsets.GenericViewSet):
     """
     List of service packages.
+
+    Responses have an ETag and can be fetched conditionally.
     """
     serializer_class = ServicePackageSerializer
     permission_classes = [AllowAny]
 
     def get_queryset(self):
         return ServicePackage.objects.all()
+
+    def get_content_versions(self):
+        return ['services']
     
@@ -1,51 +1,156 @@
 from django.conf import settings
 from django.db import transaction
 
-from organisation.models import YTRCompany
-from ytr import parser
+from organisation.models import Company, YTRCompany
+from ytr import parser, stream
 
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from requests.packages.urllib3.util.retry import Retry
 import requests, json
+import threading
+import time
 
 import logging
 logger = logging.getLogger(__name__)
 
+# Python 2 has no monotonic clock
+_clock = getattr(time, 'monotonic', time.time)
+
 class YtrError(Exception):
     pass
 
-def _get(path):
+class EndpointMetrics(object):
+    """Request counts and latencies of YTR requests by endpoint.
+
+    The endpoint is the request path without the query string. The
+    latency of a request includes its retries.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._endpoints = {}
+
+    def record(self, endpoint, seconds, error=False):
+        with self._lock:
+            m = self._endpoints.setdefault(endpoint, {'requests': 0, 'errors': 0, 'total': 0.0, 'max': 0.0})
+            m['requests'] += 1
+            m['errors'] += error
+            m['total'] += seconds
+            m['max'] = max(m['max'], seconds)
+
+    def snapshot(self):
+        """Get the metrics as a dict of endpoint -> dict of requests,
+        errors, and total, mean and max latency in seconds.
+        """
+        with self._lock:
+            return {
+                endpoint: dict(m, mean=m['total'] / m['requests'])
+                for endpoint, m in self._endpoints.items()
+            }
+
+    def reset(self):
+        with self._lock:
+            self._endpoints = {}
+
+metrics = EndpointMetrics()
+
+_session = None
+_session_pool_size = 0
+_session_lock = threading.Lock()
+
+def get_session(pool_size=None):
+    """Get the HTTP session used for YTR requests.
+
+    The session is shared by all threads, so connections to YTR are
+    kept alive and reused. The connection pool holds pool_size
+    connections (at least YTR_IMPORT_WORKERS), and is grown if a larger
+    pool is requested later. Threads beyond that wait for a free
+    connection, so no connection is discarded.
+
+    Failed connections and server errors are retried YTR_RETRIES times
+    with an exponential backoff. POST requests are not retried, since
+    they are not idempotent.
+    """
+    global _session, _session_pool_size
+    pool_size = max(pool_size or 0, settings.YTR_IMPORT_WORKERS)
+
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            _session.headers.update({
+                "Accept": "application/json",
+            })
+
+        if pool_size > _session_pool_size:
+            # Requests in flight keep using the previous adapter
+            adapter = HTTPAdapter(
+                pool_maxsize=pool_size,
+                pool_block=True,
+                max_retries=Retry(
+                    total=settings.YTR_RETRIES,
+                    backoff_factor=settings.YTR_RETRY_BACKOFF,
+                    status_forcelist=(500, 502, 503, 504),
+                ),
+            )
+            _session.mount('http://', adapter)
+            _session.mount('https://', adapter)
+            _session_pool_size = pool_size
+
+        return _session
+
+def close_session():
+    """Close the pooled connections. A new session is created on the next request."""
+    global _session, _session_pool_size
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+            _session = None
+            _session_pool_size = 0
+
+def _request(method, path, **kwargs):
     assert(path[0] == '/')
 
+    endpoint = path.split('?', 1)[0]
     path = settings.YTR_API_ROOT + path
-    logger.info("Fetching " + path)
-    r = requests.get(path)
+    kwargs.setdefault('timeout', settings.YTR_TIMEOUT)
+
+    start = _clock()
+    try:
+        r = get_session().request(method, path, **kwargs)
+    except requests.RequestException as e:
+        metrics.record(endpoint, _clock() - start, error=True)
+        error = "%s Error on %s: %s" % (method, path, e)
+        logger.error(error)
+        raise YtrError(error)
+
+    elapsed = _clock() - start
+    metrics.record(endpoint, elapsed, error=r.status_code != 200)
+    logger.debug("%s %s: %d in %.3fs", method, path, r.status_code, elapsed)
 
     if r.status_code != 200:
-        logger.error("Error fetching %s: error code %d" % (path, r.status_code))
-        raise YtrError("Error fetching %s: error code %d" % (path, r.status_code))
+        error = "%s Error on %s: error code %d" % (method, path, r.status_code)
+        logger.error(error)
+        raise YtrError(error)
+
+    return r
 
-    return r.json()
+def _get(path):
+    logger.info("Fetching " + settings.YTR_API_ROOT + path)
+    return _request('GET', path).json()
 
 def _post(path, data = None, **kwargs):
-    assert (path[0] == '/')
     if data is None:
         data = {}
 
-    path = settings.YTR_API_ROOT + path
-    logger.info('POST '+path)
+    logger.info('POST ' + settings.YTR_API_ROOT + path)
 
-    s = requests.Session()
-    s.headers.update({
+    headers = {
         "Content-Type": "application/json",
-        "Accept": "application/json",
         "Allow": "POST,PUT,PATCH,HEAD"
-    })
-    payload = json.dumps(data)
-    r = s.post(path, data=payload, **kwargs)
-    if r.status_code != 200:
-        error = "POST Error on %s: error code %d" % (path, r.status_code)
-        logger.error(error)
-        raise YtrError(error)
-    return r
+    }
+    return _request('POST', path, data=json.dumps(data), headers=headers, **kwargs)
 
 def fetch_company(company):
     """Import a company.
@@ -57,7 +162,7 @@ def fetch_company(company):
     if not isinstance(company, str):
         company = company.businessid
 
-    data = _get('/cxf/toimijat/yritykset?ytunnus=%s&tarkatTiedot=true' % company)
+    data = _get(_company_path(company))
 
     with transaction.atomic():
         companies = parser.import_company_resultset(data, overwrite=True)
@@ -65,6 +170,118 @@ def fetch_company(company):
     return companies[0] if len(companies) > 0 else None
 
 
+def import_resultset(query, batch_size=None, progress=None):
+    """Import all companies returned by a YTR company query, such as
+    the whole registry.
+
+    The result set is parsed as it is downloaded and imported in
+    batches (see parser.import_company_stream), so memory use does not
+    depend on the size of the result set.
+
+    :param query: path and query string of the company query
+    :return: number of imported companies
+    """
+    logger.info("Fetching " + settings.YTR_API_ROOT + query)
+    r = _request('GET', query, stream=True)
+    try:
+        return parser.import_company_stream(
+            stream.iter_companies(r.iter_content(chunk_size=64 * 1024)),
+            batch_size=batch_size or settings.YTR_IMPORT_BATCH_SIZE,
+            overwrite=True,
+            progress=progress,
+        )
+    finally:
+        r.close()
+
+
+def _company_path(businessid):
+    return '/cxf/toimijat/yritykset?ytunnus=%s&tarkatTiedot=true' % businessid
+
+
+BulkImportResult = namedtuple('BulkImportResult', ('companies', 'errors'))
+
+def fetch_companies(businessids, workers=None, batch_size=None, progress=None):
+    """Import many companies.
+
+    The companies are fetched concurrently by a pool of worker threads,
+    while the previously fetched batch is imported set-wise in the
+    calling thread, one transaction per batch. A company that fails to
+    import does not prevent the rest of its batch from being imported.
+
+    :param businessids: business IDs of the companies to import
+    :param workers: number of fetching threads (default is YTR_IMPORT_WORKERS)
+    :param batch_size: companies per transaction (default is YTR_IMPORT_BATCH_SIZE)
+    :param progress: function called with (done, total) after each batch
+    :return: BulkImportResult of the imported companies and a dict of
+             errors by business ID
+    """
+    workers = workers or settings.YTR_IMPORT_WORKERS
+    batch_size = batch_size or settings.YTR_IMPORT_BATCH_SIZE
+
+    # A connection for each worker
+    get_session(pool_size=workers)
+
+    businessids = list(dict.fromkeys(businessids))
+    batches = [businessids[i:i+batch_size] for i in range(0, len(businessids), batch_size)]
+
+    companies = []
+    errors = {}
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        def submit(batch):
+            return [(businessid, executor.submit(_get, _company_path(businessid))) for businessid in batch]
+
+        fetching = submit(batches[0]) if batches else []
+        for i in range(len(batches)):
+            # Keep the workers busy with the next batch while this one is imported
+            fetched = fetching
+            fetching = submit(batches[i+1]) if i + 1 < len(batches) else []
+
+            results = []
+            for businessid, future in fetched:
+                try:
+                    nodes = future.result()['haeYrityksetResult']['yritykset']['yritys']
+                except (YtrError, ValueError, KeyError, TypeError) as e:
+                    errors[businessid] = str(e)
+                    continue
+
+                if nodes:
+                    results.append((businessid, nodes))
+                else:
+                    errors[businessid] = "Not found"
+
+            with transaction.atomic():
+                companies.extend(_import_batch(results, errors))
+
+            if progress is not None:
+                progress(sum(len(b) for b in batches[:i+1]), len(businessids))
+
+    return BulkImportResult(companies, errors)
+
+
+def _import_batch(results, errors):
+    """Import a batch of fetched (business ID, company nodes) pairs.
+
+    The batch is imported set-wise. If that fails, the companies are
+    imported one by one, so the failing ones can be reported in errors.
+    """
+    try:
+        with transaction.atomic():
+            return parser.import_companies([node for businessid, nodes in results for node in nodes], overwrite=True)
+    except Exception:
+        logger.exception("Error importing a batch of companies, retrying one by one")
+
+    companies = []
+    for businessid, nodes in results:
+        try:
+            with transaction.atomic():
+                companies.extend(parser.import_companies(nodes, overwrite=True))
+        except Exception as e:
+            logger.exception("Error importing company %s", businessid)
+            errors[businessid] = str(e)
+    return companies
+
+
 def find_company(company):
     """
     Look for company in YTR, return data if found else None
@@ -83,6 +300,7 @@ def export_company(company):
     if company.has_ytr() and company.ytr.code:
         url = '/cxf/yleiset/update'
         r = _post(url, YTRCompany.map(company))
+        _exported(company)
         return True
 
     # On insert check first is there a record on given business ID
@@ -96,13 +314,50 @@ def export_company(company):
         ytr = find_company(company)
         # Create record for our side
         try:
-            company = YTRCompany.objects.create(company=company, code=ytr['code'])
+            YTRCompany.objects.create(company=company, code=ytr['code'])
             # update data to YTR
             url = '/cxf/yleiset/update'
             r = _post(url, YTRCompany.map(company))
+            _exported(company)
             return True
-        except ValueError:
+        except (ValueError, TypeError):
             # after second find... something went wrong
             pass
-    logger.error("Cannot update company ([}) into YTR".format(company.businessid))
+    logger.error("Cannot update company ({}) into YTR".format(company.businessid))
     return False
+
+
+def _exported(company):
+    company.ytr.exported_hash = YTRCompany.export_hash(company)
+    company.ytr.save(update_fields=['exported_hash'])
+
+
+def changed_companies(include_new=False):
+    """Find the companies whose data has changed since it was last
+    imported from or exported to YTR.
+
+    :param include_new: include companies that are not linked to YTR yet
+    """
+    companies = Company.objects.filter(active=True).select_related('ytr').order_by('id')
+    if not include_new:
+        companies = companies.filter(ytr__isnull=False)
+
+    for company in companies.iterator():
+        if not company.has_ytr() or company.ytr.exported_hash != YTRCompany.export_hash(company):
+            yield company
+
+
+def export_changed_companies(include_new=False):
+    """Export the companies whose data has changed (see changed_companies.)
+
+    Returns a pair of lists of the exported and failed companies.
+    """
+    exported = []
+    failed = []
+    for company in changed_companies(include_new=include_new):
+        try:
+            ok = export_company(company)
+        except YtrError:
+            ok = False
+        (exported if ok else failed).append(company)
+    return exported, failed
@@ -0,0 +1,95 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from ytr import client, stream
+from ytr import parser as ytr_parser
+
+import sys
+
+class Command(BaseCommand):
+    help = "Import or update companies from YTR by business ID, or from YTR result sets"
+
+    def add_arguments(self, parser):
+        parser.add_argument('businessids', nargs='*',
+                            help='Business IDs of the companies to import')
+        parser.add_argument('--file', action='store', dest='file',
+                            help='Read business IDs from this file, one per line ("-" for standard input)')
+        parser.add_argument('--resultset-file', action='store', dest='resultset_file',
+                            help='Import all companies of a YTR result set file ("-" for standard input)')
+        parser.add_argument('--resultset-query', action='store', dest='resultset_query',
+                            help='Import all companies returned by this YTR query '
+                                 '(for example /cxf/toimijat/yritykset?tarkatTiedot=true)')
+        parser.add_argument('--workers', action='store', type=int, dest='workers',
+                            help='Number of concurrent requests to YTR')
+        parser.add_argument('--batch-size', action='store', type=int, dest='batch_size',
+                            help='How many companies to import in one transaction')
+
+    def handle(self, *args, **options):
+        self.verbosity = int(options.get('verbosity'))
+        businessids = list(options['businessids'])
+
+        if options['file'] == '-':
+            businessids += self.read_ids(sys.stdin)
+        elif options['file']:
+            with open(options['file'], 'r') as f:
+                businessids += self.read_ids(f)
+
+        if not businessids and not options['resultset_file'] and not options['resultset_query']:
+            raise CommandError("No business IDs or result sets given")
+
+        progress = self.progress if self.verbosity > 1 else None
+
+        # Result sets are parsed and imported as they are read
+        if options['resultset_file']:
+            if options['resultset_file'] == '-':
+                # Python 2 reads bytes from sys.stdin itself
+                count = self.import_file(getattr(sys.stdin, 'buffer', sys.stdin), options['batch_size'], progress)
+            else:
+                with open(options['resultset_file'], 'rb') as f:
+                    count = self.import_file(f, options['batch_size'], progress)
+            if self.verbosity > 0:
+                self.stdout.write("Imported {} companies from {}".format(count, options['resultset_file']))
+
+        if options['resultset_query']:
+            count = client.import_resultset(options['resultset_query'], batch_size=options['batch_size'], progress=progress)
+            if self.verbosity > 0:
+                self.stdout.write("Imported {} companies from {}".format(count, options['resultset_query']))
+
+        if not businessids:
+            return
+
+        result = client.fetch_companies(
+            businessids,
+            workers=options['workers'],
+            batch_size=options['batch_size'],
+            progress=progress
+        )
+
+        if self.verbosity > 0:
+            for businessid, error in sorted(result.errors.items()):
+                self.stderr.write("{} {}".format(businessid, error))
+            self.stdout.write("Imported {} companies, {} failed".format(len(result.companies), len(result.errors)))
+
+        if self.verbosity > 1:
+            for endpoint, m in sorted(client.metrics.snapshot().items()):
+                self.stdout.write("%s: %d requests, %d errors, mean %.3fs, max %.3fs" % (
+                    endpoint, m['requests'], m['errors'], m['mean'], m['max']))
+
+    @staticmethod
+    def read_ids(f):
+        return [line.strip() for line in f if line.strip()]
+
+    @staticmethod
+    def import_file(f, batch_size, progress):
+        return ytr_parser.import_company_stream(
+            stream.iter_companies(stream.iter_file(f)),
+            batch_size=batch_size or settings.YTR_IMPORT_BATCH_SIZE,
+            overwrite=True,
+            progress=progress,
+        )
+
+    def progress(self, done, total):
+        if total is None:
+            self.stdout.write("Processed {}".format(done))
+        else:
+            self.stdout.write("Processed {} of {}".format(done, total))
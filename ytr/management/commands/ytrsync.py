@@ -0,0 +1,64 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from organisation.models import Company, YTRCompany
+from ytr import client
+
+class Command(BaseCommand):
+    help = "Synchronize companies with YTR: import the companies changed in YTR and export the ones changed here"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--no-import', action='store_false', dest='do_import', default=True,
+                            help='Do not import changes from YTR')
+        parser.add_argument('--no-export', action='store_false', dest='do_export', default=True,
+                            help='Do not export changes to YTR')
+        parser.add_argument('--all', action='store_true', dest='all', default=False,
+                            help='Import all companies, not just the ones linked to YTR')
+        parser.add_argument('--export-new', action='store_true', dest='export_new', default=False,
+                            help='Also export companies that are not in YTR yet')
+        parser.add_argument('--workers', action='store', type=int, dest='workers',
+                            help='Number of concurrent requests to YTR')
+        parser.add_argument('--batch-size', action='store', type=int, dest='batch_size',
+                            help='How many companies to import in one transaction')
+
+    def handle(self, *args, **options):
+        self.verbosity = int(options.get('verbosity'))
+
+        if options['do_import']:
+            self.sync_import(options)
+
+        if options['do_export']:
+            exported, failed = client.export_changed_companies(include_new=options['export_new'])
+
+            if self.verbosity > 0:
+                for company in failed:
+                    self.stderr.write("{} export failed".format(company.businessid))
+                self.stdout.write("Exported {} companies, {} failed".format(len(exported), len(failed)))
+
+    def sync_import(self, options):
+        started = timezone.now()
+
+        companies = Company.objects.all()
+        if not options['all']:
+            companies = companies.filter(ytr__isnull=False)
+
+        result = client.fetch_companies(
+            companies.order_by('id').values_list('businessid', flat=True),
+            workers=options['workers'],
+            batch_size=options['batch_size'],
+            progress=self.progress if self.verbosity > 1 else None
+        )
+
+        if self.verbosity > 0:
+            for businessid, error in sorted(result.errors.items()):
+                self.stderr.write("{} {}".format(businessid, error))
+
+            unchanged = sum(1 for c in result.companies if getattr(c, '_unchanged', False))
+            not_seen = YTRCompany.objects.filter(company__isnull=False) \
+                .exclude(last_seen__gte=started).count()
+            self.stdout.write(
+                "Imported {} changed companies, {} unchanged, {} failed, {} linked companies not seen in YTR".format(
+                    len(result.companies) - unchanged, unchanged, len(result.errors), not_seen))
+
+    def progress(self, done, total):
+        self.stdout.write("Processed {} of {}".format(done, total))
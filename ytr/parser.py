@@ -1,62 +1,181 @@
-from organisation.models import Company, Address, YTRCompany
+from django.db import connection, transaction
+from django.utils import timezone
 
+from organisation.models import Company, Address, YTRCompany, bump_company_versions
+from organisation.search import update_search_vectors
+from ytr import stream
+
+import hashlib
+import json
 import logging
 logger = logging.getLogger(__name__)
 
+# Address fields set from YTR. Addresses are only rewritten when these change.
+ADDRESS_FIELDS = ('addressType', 'streetAddress', 'streetAddress2', 'streetAddress3', 'postalcode', 'city', 'country')
+
 def import_company_resultset(node, overwrite=False):
-    out = []
-    for company in node['haeYrityksetResult']['yritykset']['yritys']:
-        out.append(import_company(company, overwrite=overwrite))
-    return out
+    return import_companies(node['haeYrityksetResult']['yritykset']['yritys'], overwrite=overwrite)
+
+
+def import_company_stream(nodes, batch_size=100, overwrite=False, progress=None):
+    """Import companies from an iterable of "Yritys" nodes, such as a
+    streamed result set (see ytr.stream.)
+
+    The nodes are imported in batches of batch_size, each in its own
+    transaction, so only one batch is kept in memory.
+
+    :param progress: function called with (done, None) after each batch
+    :return: number of imported companies
+    """
+    count = 0
+    done = 0
+    for batch in stream.chunked(nodes, batch_size):
+        with transaction.atomic():
+            count += sum(1 for c in import_companies(batch, overwrite=overwrite) if c is not None)
+        done += len(batch)
+        if progress is not None:
+            progress(done, None)
+    return count
 
 
 def import_company(node, overwrite=False):
     """Import a company from the given "Yritys" node.
-    If the company already exists, AlreadyExist is raised.
+    If the company already exists, it is skipped and None is returned.
     If the parameter overwrite is set to True, the existing
     company's information will be updated from the node.
     """
+    return import_companies([node], overwrite=overwrite)[0]
+
+
+def import_companies(nodes, overwrite=False):
+    """Import companies from a list of "Yritys" nodes.
+
+    The companies are imported set-wise: the existing companies, YTR
+    links and addresses are loaded with one query each, and new and
+    changed rows are written in bulk. Addresses are only rewritten for
+    companies whose addresses have changed. The number of queries does
+    not depend on the number of companies.
+
+    Companies with a YTR link whose data has not changed since the last
+    import (see content_hash) are not updated, only marked as seen. They
+    have the attribute "_unchanged" set.
+
+    This should be called in a transaction.
+
+    Returns a list of imported companies in the order of the nodes.
+    Existing companies are skipped (None in the list) unless overwrite
+    is set. New companies have the attribute "_new" set.
+    """
+    nodes_by_id = {}
+    for node in nodes:
+        nodes_by_id[node['yritysTunnus']] = node
+
+    existing = {
+        c.businessid: c for c in
+        Company.objects.filter(businessid__in=list(nodes_by_id)).select_related('ytr')
+    }
 
-    businessid = node['yritysTunnus']
+    new = []
+    changed = []
+    unchanged = set()
+    imported = {}
+    hashes = {}
+    for businessid, node in nodes_by_id.items():
+        company = existing.get(businessid)
+        hashes[businessid] = content_hash(node)
 
-    try:
-        company = Company.objects.get(businessid=businessid)
+        if company is None:
+            company = Company(
+                businessid=businessid,
+                service_areas=[],
+                price_per_hour=None,
+                price_per_hour_continuing=None,
+                )
+            company._new = True
+            new.append(company)
 
-        if not overwrite:
+        elif not overwrite:
             logger.info("Company {} already imported. Skipping.".format(businessid))
-            return
+            continue
+
+        elif company.has_ytr() and company.ytr.content_hash == hashes[businessid]:
+            unchanged.add(businessid)
+            company._unchanged = True
+            imported[businessid] = company
+            continue
+
+        fields = company_fields(node)
+        if company.pk is not None and any(getattr(company, f) != v for f, v in fields.items()):
+            changed.append(company)
+        for f, v in fields.items():
+            setattr(company, f, v)
+
+        imported[businessid] = company
+
+    Company.objects.bulk_create(new)
+    _update_companies(changed)
+
+    now = timezone.now()
+    linked = []
+    for businessid, c in imported.items():
+        if getattr(c, '_new', False) or not c.has_ytr():
+            if nodes_by_id[businessid].get('code', None):
+                c.ytr = YTRCompany(company=c, code=nodes_by_id[businessid]['code'])
+            else:
+                continue
+        elif businessid in unchanged:
+            c.ytr.last_seen = now
+            linked.append(c.ytr)
+            continue
+        c.ytr.content_hash = hashes[businessid]
+        c.ytr.exported_hash = YTRCompany.export_hash(c, c.ytr.code)
+        c.ytr.last_seen = now
+        linked.append(c.ytr)
 
-    except Company.DoesNotExist:
-        company = Company(
-            businessid=businessid,
-            service_areas=[],
-            price_per_hour=None,
-            price_per_hour_continuing=None,
-            )
-        company._new = True
+    YTRCompany.objects.bulk_create([y for y in linked if y.pk is None])
+    _update_ytr_companies([y for y in linked if y.pk is not None])
 
-    company.name = node['name']
+    readdressed = _update_addresses({
+        c.pk: addresses(nodes_by_id[b]) for b, c in imported.items() if b not in unchanged
+    })
+
+    modified = set(c.pk for c in new + changed) | readdressed
+    if modified:
+        update_search_vectors(modified)
+        bump_company_versions(*modified)
+
+    return [imported.get(node['yritysTunnus']) for node in nodes]
+
+
+def content_hash(node):
+    """Hash of the data imported from a "Yritys" node."""
+    data = [node.get('code', None), company_fields(node), addresses(node)]
+    return hashlib.sha256(json.dumps(data, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def company_fields(node):
+    """Get the company fields set from a "Yritys" node."""
+    fields = {'name': node['name']}
 
     # Currently, we only have one email address and phone number
     emails = node.get('sahkoisetYhteystiedot', {}).get('organisaatioSahkoinenYhteystieto', [])
     for email in emails:
         if int(email['yhteystietoTyyppi']['code']) == 1:
-            company.email = email['yhteystieto']
+            fields['email'] = email['yhteystieto']
             break
 
     phones = node.get('puhelinnumerot', {}).get('organisaatioPuhelinnumero', [])
     for phone in phones:
         if int(phone['puhelinnumeroTyyppi']['code']) == 5: # TODO what are the different types?
-            company.phone = phone['numero']
+            fields['phone'] = phone['numero']
             break
 
-    company.save()
-    if not company.has_ytr() and node.get('code', None):
-        YTRCompany.objects.create(company=company, code=node.get('code'))
+    return fields
+
 
-    # Update addresses
-    addresses = [Address(
-        company=company,
+def addresses(node):
+    """Get the address field values from a "Yritys" node."""
+    return [dict(
         addressType=address_type(a['osoitetyyppi']['code']),
         streetAddress=a['katuOsoite'],
         streetAddress2=a['katuOsoite2'] or '',
@@ -66,10 +185,74 @@ def import_company(node, overwrite=False):
         country=a['maa']['maatunnusKoodi'],
         ) for a in node['osoitteet']['organisaatioOsoite']]
 
-    company.addresses.all().delete()
-    Address.objects.bulk_create(addresses)
 
-    return company
+def _update_companies(companies):
+    """Write the YTR fields of changed companies in one query."""
+    if not companies:
+        return
+
+    with connection.cursor() as cursor:
+        cursor.execute("""
+            UPDATE organisation_company c SET name = v.name, email = v.email, phone = v.phone
+            FROM unnest(%s::integer[], %s::text[], %s::text[], %s::text[]) AS v(id, name, email, phone)
+            WHERE c.id = v.id
+            """, [
+                [c.pk for c in companies],
+                [c.name for c in companies],
+                [c.email for c in companies],
+                [c.phone for c in companies],
+            ])
+
+
+def _update_ytr_companies(ytr_companies):
+    """Write the synchronization state of YTR links in one query."""
+    if not ytr_companies:
+        return
+
+    with connection.cursor() as cursor:
+        cursor.execute("""
+            UPDATE organisation_ytrcompany y
+            SET content_hash = v.content_hash, exported_hash = v.exported_hash, last_seen = v.last_seen
+            FROM unnest(%s::integer[], %s::text[], %s::text[], %s::timestamptz[])
+                AS v(id, content_hash, exported_hash, last_seen)
+            WHERE y.id = v.id
+            """, [
+                [y.pk for y in ytr_companies],
+                [y.content_hash for y in ytr_companies],
+                [y.exported_hash for y in ytr_companies],
+                [y.last_seen for y in ytr_companies],
+            ])
+
+
+def _update_addresses(new_addresses):
+    """Replace the addresses of companies whose addresses have changed.
+
+    :param new_addresses: dict of company ID -> list of address field dicts
+    :return: set of IDs of the companies whose addresses were replaced
+    """
+    def key(address):
+        return tuple(address[f] for f in ADDRESS_FIELDS)
+
+    old_addresses = {}
+    for address in Address.objects.filter(company_id__in=list(new_addresses)).values('company_id', *ADDRESS_FIELDS):
+        old_addresses.setdefault(address['company_id'], []).append(key(address))
+
+    changed = set(
+        company_id for company_id, new in new_addresses.items()
+        if sorted(old_addresses.get(company_id, [])) != sorted(key(a) for a in new)
+    )
+
+    if changed:
+        # Deleted without signals: the companies' versions are bumped by the caller
+        with connection.cursor() as cursor:
+            cursor.execute("DELETE FROM organisation_address WHERE company_id = ANY(%s)", [list(changed)])
+
+        Address.objects.bulk_create([
+            Address(company_id=company_id, **address)
+            for company_id in changed for address in new_addresses[company_id]
+        ])
+
+    return changed
 
 
 def address_type(code):
@@ -1,9 +1,23 @@
+from django.conf import settings
 from rest_framework import serializers
 
 class YtrFetchSerializer(serializers.Serializer):
     businessid = serializers.CharField(max_length=9)
 
 
+class YtrBulkFetchSerializer(serializers.Serializer):
+    businessids = serializers.ListField(child=serializers.CharField(max_length=9))
+
+    def validate_businessids(self, value):
+        if not value:
+            raise serializers.ValidationError("No business IDs given")
+        if len(value) > settings.YTR_IMPORT_MAX_BULK:
+            raise serializers.ValidationError(
+                "At most %d business IDs can be imported at once, use the ytrimport command for more"
+                % settings.YTR_IMPORT_MAX_BULK)
+        return value
+
+
 class YtrCompanySerializer(serializers.Serializer):
     businessid = serializers.CharField(max_length=9)
     name = serializers.CharField(max_length=200)
\ No newline at end of file
@@ -0,0 +1,139 @@
+"""
+Streaming parsing of large YTR result sets.
+
+A full YTR company registry does not fit comfortably in memory as one
+parsed JSON document. iter_companies() reads a result set from a
+stream of chunks and yields the "Yritys" nodes one at a time, keeping
+only the node being parsed (and one chunk) in memory.
+"""
+
+import codecs
+import json
+
+RESULTSET_PATH = ('haeYrityksetResult', 'yritykset', 'yritys')
+
+
+class _Reader(object):
+    """A buffer over a stream of text or UTF-8 encoded byte chunks."""
+
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.utf8 = codecs.getincrementaldecoder('utf-8')()
+        self.decoder = json.JSONDecoder()
+        self.buf = ''
+        self.pos = 0
+        self.eof = False
+
+    def read(self):
+        # Drop the consumed part of the buffer
+        if self.pos > 0:
+            self.buf = self.buf[self.pos:]
+            self.pos = 0
+
+        try:
+            chunk = next(self.chunks)
+        except StopIteration:
+            self.buf += self.utf8.decode(b'', final=True)
+            self.eof = True
+            return
+
+        self.buf += self.utf8.decode(chunk) if isinstance(chunk, bytes) else chunk
+
+    def peek(self):
+        """Get the next non-whitespace character, or None at the end."""
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in ' \t\r\n':
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if self.eof:
+                return None
+            self.read()
+
+    def value(self):
+        """Decode the JSON value at the current position."""
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buf, self.pos)
+                # A value at the end of the buffer may continue in the next chunk
+                if end < len(self.buf) or self.eof:
+                    self.pos = end
+                    return value
+            except ValueError:
+                if self.eof:
+                    raise
+            self.read()
+
+
+def iter_array(chunks, path):
+    """Iterate the elements of a JSON array in a JSON document.
+
+    :param chunks: iterable of text or UTF-8 encoded byte chunks of the document
+    :param path: keys of the objects leading to the array, from the root
+    """
+    reader = _Reader(chunks)
+    _seek(reader, list(path))
+
+    if reader.peek() == ']':
+        return
+
+    while True:
+        yield reader.value()
+
+        c = reader.peek()
+        if c == ']':
+            return
+        if c != ',':
+            raise ValueError("Expected ',' or ']' in array, got %r" % c)
+        reader.pos += 1
+        reader.peek()
+
+
+def _seek(reader, path):
+    """Move the reader past the opening bracket of the array at path."""
+    # Stack of [container, key] pairs: the key is the current key of an object
+    stack = []
+    string = None
+
+    while True:
+        c = reader.peek()
+        if c is None:
+            raise ValueError("No array at %s" % '.'.join(path))
+
+        if c == '"':
+            string = reader.value()
+            continue
+
+        reader.pos += 1
+        if c == '{':
+            stack.append(['{', None])
+        elif c == '[':
+            if all(container == '{' for container, key in stack) and [key for container, key in stack] == path:
+                return
+            stack.append(['[', None])
+        elif c in '}]':
+            stack.pop()
+        elif c == ':':
+            stack[-1][1] = string
+
+
+def iter_companies(chunks):
+    """Iterate the "Yritys" nodes of a YTR company result set."""
+    return iter_array(chunks, RESULTSET_PATH)
+
+
+def iter_file(f, chunk_size=64 * 1024):
+    """Iterate the chunks of a file."""
+    return iter(lambda: f.read(chunk_size), f.read(0))
+
+
+def chunked(iterable, size):
+    """Split an iterable into lists of at most size items."""
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
@@ -1,10 +1,24 @@
-from django.test import TestCase
+from django.core.management import call_command
+from django.core.urlresolvers import reverse
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
 
-from ytr import parser
+from ytr import client, parser, stream
 from organisation.models import Company, Address
+from palvelutori.models import User
 
+from copy import deepcopy
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from urllib.parse import parse_qs, urlsplit
+import datetime
 import os
 import json
+import threading
 
 # Create your tests here.
 class ParserTest(TestCase):
@@ -27,13 +41,292 @@ class ParserTest(TestCase):
         self.assertEqual(addr.city, 'Tarvasjoki')
         self.assertEqual(addr.country, 'FI')
 
+    def test_stream(self):
+        example = get_example('yritykset-2467503-7.json')
+
+        # Nodes can be split across any chunks
+        with open(os.path.join(EXAMPLE_DIR, 'yritykset-2467503-7.json'), 'rb') as f:
+            nodes = list(stream.iter_companies(stream.iter_file(f, chunk_size=7)))
+        self.assertEqual(nodes, example['haeYrityksetResult']['yritykset']['yritys'])
+
+        call_command('ytrimport', resultset_file=os.path.join(EXAMPLE_DIR, 'yritykset-2467503-7.json'), verbosity=0)
+        self.assertEqual(Company.objects.get().businessid, '2467503-7')
+
+    def test_import_companies(self):
+        examples = YtrStandInServer()
+
+        def count_import_queries(businessids):
+            with CaptureQueriesContext(connection) as queries:
+                companies = parser.import_companies([examples.company(b) for b in businessids], overwrite=True)
+            self.assertEqual([c.businessid for c in companies], businessids)
+            return len(queries)
+
+        # The number of queries does not depend on the number of companies
+        small = ['2%06d-0' % i for i in range(10)]
+        large = ['3%06d-0' % i for i in range(100)]
+        self.assertEqual(count_import_queries(small), count_import_queries(large))
+        self.assertEqual(Company.objects.count(), len(small) + len(large))
+
+        # Unchanged companies are not written
+        addresses = set(Address.objects.values_list('id', flat=True))
+        self.assertEqual(count_import_queries(large), 2)
+        self.assertEqual(set(Address.objects.values_list('id', flat=True)), addresses)
+
+        # Changed addresses are rewritten
+        node = examples.company(small[0])
+        node['osoitteet']['organisaatioOsoite'][0]['katuOsoite'] = 'Uusikatu 1'
+        parser.import_companies([node], overwrite=True)
+        self.assertEqual(Company.objects.get(businessid=small[0]).addresses.get().streetAddress, 'Uusikatu 1')
+
+
+@override_settings(YTR_RETRY_BACKOFF=0)
+class BulkImportTest(APITestCase):
+    businessids = ['2467503-7'] + ['1%06d-%d' % (i, i % 10) for i in range(50)]
+    missing = '0000000-0'
+    failing = '9999999-9'
+    flaky = '8888888-8'
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = YtrStandInServer(missing=[cls.missing], failing=[cls.failing], flaky=[cls.flaky])
+        cls.server.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+        super().tearDownClass()
+
+    def setUp(self):
+        # Use a new session with the test settings
+        client.close_session()
+        client.metrics.reset()
+
+    def test_fetch_companies(self):
+        progress = []
+        with self.settings(YTR_API_ROOT=self.server.url, YTR_IMPORT_WORKERS=2):
+            result = client.fetch_companies(
+                self.businessids + [self.missing, self.failing],
+                workers=4,
+                batch_size=10,
+                progress=lambda done, total: progress.append((done, total))
+                )
+
+        self.assertEqual(len(result.companies), len(self.businessids))
+        self.assertEqual(set(result.errors), {self.missing, self.failing})
+        self.assertEqual(Company.objects.count(), len(self.businessids))
+        self.assertEqual(Company.objects.get(businessid='2467503-7').name, 'MKV Siistix')
+        self.assertEqual(progress[-1], (len(self.businessids) + 2, len(self.businessids) + 2))
+
+        # The connection pool fits all workers, so no connection is discarded
+        self.assertLessEqual(len(self.server.connections), 4)
+
+        # Importing again updates the existing companies
+        with self.settings(YTR_API_ROOT=self.server.url):
+            call_command('ytrimport', *self.businessids[:5], verbosity=0)
+        self.assertEqual(Company.objects.count(), len(self.businessids))
+
+    def test_session(self):
+        with self.settings(YTR_API_ROOT=self.server.url):
+            # Server errors are retried
+            company = client.fetch_company(self.flaky)
+            for businessid in self.businessids[:10]:
+                client.fetch_company(businessid)
+
+            with self.assertRaises(client.YtrError):
+                client.fetch_company(self.failing)
+
+        self.assertEqual(company.businessid, self.flaky)
+        self.assertEqual(self.server.request_count(self.flaky), 2)
+
+        # Connections are kept alive and reused
+        self.assertLess(len(self.server.connections), 5)
+
+        m = client.metrics.snapshot()['/cxf/toimijat/yritykset']
+        self.assertEqual(m['requests'], 12)
+        self.assertEqual(m['errors'], 1)
+        self.assertGreaterEqual(m['max'], m['mean'])
+
+    def test_sync(self):
+        businessid = '2467503-7'
+        original = self.server.companies[businessid]
+        self.addCleanup(self.server.companies.__setitem__, businessid, original)
+
+        with self.settings(YTR_API_ROOT=self.server.url):
+            company = client.fetch_company(businessid)
+            addresses = list(company.addresses.values_list('id', flat=True))
+
+            # Unchanged companies are skipped
+            company = client.fetch_company(businessid)
+            self.assertTrue(getattr(company, '_unchanged', False))
+            self.assertEqual(list(company.addresses.values_list('id', flat=True)), addresses)
+
+            # Changed companies are updated
+            self.server.companies[businessid] = dict(deepcopy(original), name='MKV Siistix Oy')
+            company = client.fetch_company(businessid)
+            self.assertFalse(getattr(company, '_unchanged', False))
+            self.assertEqual(Company.objects.get(businessid=businessid).name, 'MKV Siistix Oy')
+            self.assertGreater(company.ytr.last_seen, timezone.now() - datetime.timedelta(minutes=1))
+
+            # Only companies changed here are exported
+            self.assertEqual(list(client.changed_companies()), [])
+            Company.objects.filter(pk=company.pk).update(name='MKV Siistix Ab')
+            call_command('ytrsync', '--no-import', verbosity=0)
+            self.assertEqual(len(self.server.posts), 1)
+            self.assertEqual(self.server.posts[0][1]['entities'][0]['name'], 'MKV Siistix Ab')
+            self.assertEqual(list(client.changed_companies()), [])
+
+    def test_import_resultset(self):
+        self.server.registry = self.businessids[:25]
+        self.addCleanup(setattr, self.server, 'registry', [])
+
+        progress = []
+        with self.settings(YTR_API_ROOT=self.server.url):
+            count = client.import_resultset(
+                '/cxf/toimijat/yritykset?tarkatTiedot=true',
+                batch_size=10,
+                progress=lambda done, total: progress.append(done)
+                )
+
+        self.assertEqual(count, 25)
+        self.assertEqual(progress, [10, 20, 25])
+        self.assertEqual(Company.objects.count(), 25)
+
+    def test_bulk_fetch_api(self):
+        user = User.objects.create_superuser('admin@example.com', 'password')
+        url = reverse('api:ytr-fetch-bulk')
+
+        response = self.client.post(url, {'businessids': self.businessids[:5]})
+        self.assertIn(response.status_code, (status.HTTP_401_UNAUTHORIZED, status.HTTP_403_FORBIDDEN))
+
+        self.client.force_authenticate(user)
+        with self.settings(YTR_API_ROOT=self.server.url):
+            response = self.client.post(url, {'businessids': self.businessids[:5] + [self.missing]})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['imported'], 5)
+        self.assertEqual(list(response.data['errors']), [self.missing])
+
+
+class YtrStandInServer(object):
+    """A local stand-in for the YTR company API.
+
+    Companies are served from the example result sets in examples/ytr.
+    Other business IDs get a company generated from the first example,
+    except the "missing" ones, which are not found, and the "failing"
+    ones, which get a server error. The "flaky" ones get a server error
+    on the first request only. A query without a business ID returns
+    the companies in "registry".
+
+    Posted data is accepted and recorded in "posts" as (path, data) pairs.
+    The requested business IDs and the client addresses of the
+    connections are recorded.
+    """
+
+    def __init__(self, missing=(), failing=(), flaky=()):
+        self.missing = set(missing)
+        self.failing = set(failing)
+        self.flaky = set(flaky)
+        self.registry = []
+        self.requests = []
+        self.posts = []
+        self.connections = set()
+        self.companies = {}
+        for name in sorted(os.listdir(EXAMPLE_DIR)):
+            if name.startswith('yritykset-') and name.endswith('.json'):
+                for company in get_example(name)['haeYrityksetResult']['yritykset']['yritys']:
+                    self.companies[company['yritysTunnus']] = company
+        self.template = self.companies[sorted(self.companies)[0]]
+
+    def company(self, businessid):
+        if businessid in self.companies:
+            return self.companies[businessid]
+
+        company = deepcopy(self.template)
+        company['yritysTunnus'] = businessid
+        company['name'] = 'Yritys ' + businessid
+        company['code'] = None
+        return company
+
+    def resultset(self, businessid):
+        if not businessid:
+            companies = [self.company(b) for b in self.registry]
+        elif businessid in self.missing:
+            companies = []
+        else:
+            companies = [self.company(businessid)]
+        return {
+            'haeYrityksetResult': {
+                'sivujenMaara': 1,
+                'sivunPituus': len(companies),
+                'yhteisMaara': len(companies),
+                'yritykset': {'yritys': companies},
+            }
+        }
+
+    def request_count(self, businessid):
+        return self.requests.count(businessid)
+
+    def start(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                businessid = parse_qs(urlsplit(self.path).query).get('ytunnus', [''])[0]
+                server.connections.add(self.client_address)
+                server.requests.append(businessid)
+
+                if businessid in server.failing or \
+                        (businessid in server.flaky and server.request_count(businessid) == 1):
+                    code, body = 500, b''
+                else:
+                    code, body = 200, json.dumps(server.resultset(businessid)).encode('utf-8')
+
+                self.send_response(code)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length', 0))
+                server.posts.append((self.path, json.loads(self.rfile.read(length).decode('utf-8'))))
+
+                body = b'{}'
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = _ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = 'http://127.0.0.1:%d' % self.httpd.server_address[1]
+        self.thread = threading.Thread(target=self.httpd.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+EXAMPLE_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    'examples',
+    'ytr',
+    )
+
 def get_example(name):
-    path = os.path.join(
-        os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
-        'examples',
-        'ytr',
-        name
-        )
+    path = os.path.join(EXAMPLE_DIR, name)
 
     with open(path, 'r') as f:
         return json.load(f)
@@ -4,5 +4,6 @@ from . import views
 
 urlpatterns = [
     url('^fetch/$', views.YtrFetchView.as_view(), name='ytr-fetch'),
+    url('^fetch/bulk/$', views.YtrBulkFetchView.as_view(), name='ytr-fetch-bulk'),
     url('^company/$', views.YtrCompanyView.as_view(), name='ytr-company'),
 ]
@@ -37,6 +37,38 @@ class YtrFetchView(APIView):
             }, status=status.HTTP_201_CREATED if getattr(company, '_new', False) else status.HTTP_200_OK)
 
 
+class YtrBulkFetchView(APIView):
+    """
+    Update or create many companies based on data fetched from YTR.
+
+    The companies are fetched concurrently. Business IDs that could not
+    be imported are returned with the error.
+
+    The import is done within the request, so at most YTR_IMPORT_MAX_BULK
+    business IDs are accepted. Larger imports should be done with the
+    ytrimport management command.
+    """
+    permission_classes = [IsAdminUser]
+    def get_serializer(self, *args, **kwargs):
+        return YtrBulkFetchSerializer(*args, **kwargs)
+
+    def post(self, request, format=None):
+        """
+        ---
+        serializer: ytr.serializers.YtrBulkFetchSerializer
+        """
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        result = ytr_client.fetch_companies(serializer.validated_data['businessids'])
+
+        return Response({
+            'status': 'ok' if not result.errors else 'partial',
+            'imported': len(result.companies),
+            'errors': result.errors,
+        })
+
+
 class YtrCompanyView(
     mixins.CreateModelMixin,
     mixins.UpdateModelMixin,